@@ -1,25 +1,30 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
+from charts import countplot
+from dataset_cache import load_into_session, session_dataset, session_profile
+from preview import show_preview
+from export import export_pdf, export_zip
+from perf import begin_rerun, perf_panel
+from plot_stream import show_plots
+from vega_charts import CHART_BACKEND, client_chart, show_chart
 
 def display_value_counts(df):
-    # Get categorical columns
-    categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    # Get categorical columns and their value counts, computed once at ingest
+    profile = session_profile(df)
+    categorical_columns = profile['categorical_columns']
 
     # Display value counts for each categorical column individually
     st.write("### Value Counts for Categorical Columns")
     for column in categorical_columns:
         st.write(f"##### {column}")
-        value_counts = df[column].value_counts().reset_index()
-        value_counts.columns = [column, 'Count']
+        value_counts = profile['value_counts'][column]
         st.dataframe(value_counts)
+        nunique = profile['columns'][column]['nunique']
+        if nunique > len(value_counts):
+            st.caption(f"Showing the {len(value_counts)} most frequent of {nunique} values")
 
 def select_and_store_columns(df):
     # Get categorical columns
-    categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    categorical_columns = session_profile(df)['categorical_columns']
 
     # Multiselect to choose multiple categorical columns to store
     selected_columns = st.sidebar.multiselect("Select Categorical Columns to Store", categorical_columns)
@@ -28,55 +33,68 @@ def select_and_store_columns(df):
     if st.sidebar.button("Store Columns"):
         st.session_state['stored_columns'] = selected_columns
 
+def countplot_plots(df, stored_columns):
+    # File name, render cache key, renderer and arguments of the count plot of each stored column
+    profile = session_profile(df)
+    dataset_fp = st.session_state.get('dataset_fp')
+    return [
+        (
+            f"countplot_{i+1}.png",
+            (dataset_fp, 'countplot', column) if dataset_fp else None,
+            countplot,
+            (profile['value_counts'][column], column),
+        )
+        for i, column in enumerate(stored_columns)
+    ]
+
 def plot_countplots(df):
     # Retrieve stored columns from session state
     stored_columns = st.session_state.get('stored_columns', [])
 
     if stored_columns:
         st.write("### Count Plots for Stored Categorical Columns")
-        st.set_option('deprecation.showPyplotGlobalUse', False)
-        # Generate count plots for each stored column
-        for column in stored_columns:
-            st.write(f"#### {column} Count Plot")
-            plt.figure(figsize=(10, 6))
-            sns.countplot(x=column, data=df)
-            plt.xticks(rotation=45)
-            plt.xlabel(column)
-            plt.ylabel('Count')
-            st.pyplot()
-
-def download_plots(df):
+        # Generate count plots for each stored column from the profiled value counts
+        plots = countplot_plots(df, stored_columns)
+        titles = [f"#### {column} Count Plot" for column in stored_columns]
+        if CHART_BACKEND == 'vega':
+            for title, (_, _, renderer, args) in zip(titles, plots):
+                st.write(title)
+                show_chart(client_chart(renderer, *args))
+        else:
+            # Rendered in the process pool, each plot shows up as soon as it is ready
+            show_plots(titles, plots)
+
+def download_plots(df, include_pdf=False):
     # Retrieve stored columns from session state
     stored_columns = st.session_state.get('stored_columns', [])
 
     if stored_columns:
         st.write("### Download Plots for Final Presentation")
 
-        # Generate and download plots for each stored column
-        for i, column in enumerate(stored_columns):
-            plt.figure(figsize=(10, 6))
-            sns.countplot(x=column, data=df)
-            plt.xticks(rotation=45)
-            plt.xlabel(column)
-            plt.ylabel('Count')
-            # Save plot to BytesIO buffer
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png')
-            buffer.seek(0)
-            # Generate base64 encoded string for download link
-            b64 = base64.b64encode(buffer.read()).decode()
-            plt.close()
-            # Create download link
-            href = f'<a href="data:file/png;base64,{b64}" download="countplot_{i+1}.png">Download Plot {i+1}</a>'
-            st.markdown(href, unsafe_allow_html=True)
+        # Bundle the plots of all stored columns, reusing the ones already shown
+        plots = countplot_plots(df, stored_columns)
+        bar = st.progress(0.0, text="Rendering plots")
+        archive = export_zip(plots, bar.progress)
+        bar.empty()
+        st.download_button(
+            "Download Plots (ZIP)", data=archive, file_name='countplots.zip',
+            mime='application/zip', on_click='ignore',
+        )
+        if include_pdf:
+            st.download_button(
+                "Download Plots (PDF)", data=export_pdf(plots), file_name='countplots.pdf',
+                mime='application/pdf', on_click='ignore',
+            )
 
 def main():
     # Title of the app
     st.title("Do analysis using categorical variables")
 
     # Retrieve the DataFrame from session state
-    df = st.session_state['df']
-    st.write(df.head())  # Display a preview of the DataFrame
+    df = session_dataset()
+    if df is None:
+        st.stop()
+    show_preview(df)  # Display a paginated preview of the DataFrame
 
     # Display value counts for each categorical column
     display_value_counts(df)
@@ -91,18 +109,24 @@ def main():
         plot_countplots(df)
 
     # Button to download plots for final presentation
+    include_pdf = st.sidebar.checkbox("Include PDF")
     if st.sidebar.button("Download Plots"):
-        download_plots(df)  # Pass df to download_plots function
+        download_plots(df, include_pdf)  # Pass df to download_plots function
+
+    # Timings of this rerun
+    perf_panel()
 
 if __name__ == '__main__':
+    # Time the hot path of this rerun, shown in the performance panel
+    begin_rerun()
+
     # Check if 'df' is in session state
-    if 'df' not in st.session_state:
+    if session_dataset() is None:
         # Load your DataFrame into session state (replace this with your DataFrame loading logic)
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
 
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
-            st.session_state['df'] = df
+            load_into_session(uploaded_file)
 
     # Run the main app
     main()
@@ -1,14 +1,19 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
+from aggregates import numeric_summaries
+from charts import boxplot, histogram
+from dataset_cache import load_into_session, session_dataset, session_profile
+from preview import show_preview
+from export import export_pdf, export_zip
+from perf import begin_rerun, perf_panel, span
+from progressive import approximate_notice, cancel_stale_jobs, progressive_chart, progressive_result, refined
+from plot_stream import show_plots
+from sampling import scale_counts
+from vega_charts import CHART_BACKEND, client_chart, show_chart
 
 
 def select_and_store_columns(df):
     # Get numerical columns
-    numerical_columns = df.select_dtypes(include=['int', 'float']).columns.tolist()
+    numerical_columns = session_profile(df)['numerical_columns']
 
     # Multiselect to choose multiple numerical columns to store
     selected_columns = st.sidebar.multiselect("Select Numerical Columns to Store", numerical_columns)
@@ -17,22 +22,70 @@ def select_and_store_columns(df):
     if st.sidebar.button("Store Columns"):
         st.session_state['stored_columns'] = selected_columns
 
+def scale_histograms(summaries, sample, df):
+    # Histogram counts taken on the sample, scaled up to the size of the dataset
+    return {
+        column: {**summary, 'hist': (scale_counts(summary['hist'][0], sample, df), summary['hist'][1])}
+        for column, summary in summaries.items()
+    }
+
+def stored_summaries(df, columns, exact=False):
+    # Histogram and boxplot summaries of the columns, computed once per dataset and column.
+    # Unless exact is set, large datasets get summaries of the sample until the exact ones are ready.
+    dataset_fp = st.session_state.get('dataset_fp')
+    cache = st.session_state.setdefault('numeric_summaries', {})
+    missing = [column for column in columns if (dataset_fp, column) not in cache]
+    if missing and exact:
+        with span('compute', 'numeric summaries'):
+            for column, summary in numeric_summaries(df, missing).items():
+                cache[(dataset_fp, column)] = summary
+    elif missing:
+        summaries, approximate = progressive_result(
+            df, 'numeric summaries', {}, (dataset_fp, tuple(missing)),
+            lambda data, cancelled: numeric_summaries(data, missing, cancelled), scale_histograms,
+        )
+        if approximate:
+            return {column: cache.get((dataset_fp, column)) or summaries[column] for column in columns}, True
+        for column, summary in summaries.items():
+            cache[(dataset_fp, column)] = summary
+    return {column: cache[(dataset_fp, column)] for column in columns}, False
+
+def summary_plots(df, stored_columns, kind, exact=False):
+    # File name, render cache key, renderer and arguments of the histograms or boxplots of the stored columns,
+    # and whether they are drawn from the sample
+    summaries, approximate = stored_summaries(df, stored_columns, exact)
+    dataset_fp = st.session_state.get('dataset_fp')
+    renderer = histogram if kind == 'hist' else boxplot
+    plots = [
+        (
+            f"plot_{i+1}.png",
+            # Plots of the sample are not cached, the exact ones replace them shortly
+            (dataset_fp, kind, column) if dataset_fp and not approximate else None,
+            renderer,
+            (summaries[column][kind], column),
+        )
+        for i, column in enumerate(stored_columns)
+    ]
+    return plots, approximate
+
 def plot_histogram(df):
     # Retrieve stored columns from session state
     stored_columns = st.session_state.get('stored_columns', [])
 
     if stored_columns:
         st.write("### Histogram for Stored Numerical Columns")
-        st.set_option('deprecation.showPyplotGlobalUse', False)
+        plots, approximate = summary_plots(df, stored_columns, 'hist')
+        if approximate:
+            approximate_notice(df)
         # Generate histograms for each stored column
-        for column in stored_columns:
-            st.write(f"#### {column} Histogram Plot")
-            plt.figure(figsize=(10, 6))
-            sns.histplot(x=column, data=df)
-            plt.xticks(rotation=45)
-            plt.xlabel(column)
-            plt.ylabel('Count')
-            st.pyplot()
+        titles = [f"#### {column} Histogram Plot" for column in stored_columns]
+        if CHART_BACKEND == 'vega':
+            for title, (_, _, renderer, args) in zip(titles, plots):
+                st.write(title)
+                show_chart(client_chart(renderer, *args))
+        else:
+            # Rendered in the process pool, each plot shows up as soon as it is ready
+            show_plots(titles, plots)
 
 def plot_boxplot(df):
     # Retrieve stored columns from session state
@@ -40,49 +93,50 @@ def plot_boxplot(df):
 
     if stored_columns:
         st.write("### Boxplot for Stored Numerical Columns")
-        st.set_option('deprecation.showPyplotGlobalUse', False)
+        plots, approximate = summary_plots(df, stored_columns, 'box')
+        if approximate:
+            approximate_notice(df)
         # Generate boxplots for each stored column
-        for column in stored_columns:
-            st.write(f"#### {column} Boxplot")
-            plt.figure(figsize=(10, 6))
-            sns.boxplot(x=column, data=df)
-            plt.xticks(rotation=45)
-            plt.xlabel(column)
-            plt.ylabel('Value')
-            st.pyplot()
-
-def download_plots(df):
+        titles = [f"#### {column} Boxplot" for column in stored_columns]
+        if CHART_BACKEND == 'vega':
+            for title, (_, _, renderer, args) in zip(titles, plots):
+                st.write(title)
+                show_chart(client_chart(renderer, *args))
+        else:
+            # Rendered in the process pool, each plot shows up as soon as it is ready
+            show_plots(titles, plots)
+
+def download_plots(df, include_pdf=False):
     # Retrieve stored columns from session state
     stored_columns = st.session_state.get('stored_columns', [])
 
     if stored_columns:
         st.write("### Download Plots for Final Presentation")
 
-        # Generate and download plots for each stored column
-        for i, column in enumerate(stored_columns):
-            plt.figure(figsize=(10, 6))
-            sns.histplot(x=column, data=df)
-            plt.xticks(rotation=45)
-            plt.xlabel(column)
-            plt.ylabel('Count')
-            # Save plot to BytesIO buffer
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png')
-            buffer.seek(0)
-            # Generate base64 encoded string for download link
-            b64 = base64.b64encode(buffer.read()).decode()
-            plt.close()
-            # Create download link
-            href = f'<a href="data:file/png;base64,{b64}" download="plot_{i+1}.png">Download Plot {i+1}</a>'
-            st.markdown(href, unsafe_allow_html=True)
+        # Bundle the histograms of all stored columns, reusing the ones already shown
+        plots, _ = summary_plots(df, stored_columns, 'hist', exact=True)
+        bar = st.progress(0.0, text="Rendering plots")
+        archive = export_zip(plots, bar.progress)
+        bar.empty()
+        st.download_button(
+            "Download Plots (ZIP)", data=archive, file_name='histograms.zip',
+            mime='application/zip', on_click='ignore',
+        )
+        if include_pdf:
+            st.download_button(
+                "Download Plots (PDF)", data=export_pdf(plots), file_name='histograms.pdf',
+                mime='application/pdf', on_click='ignore',
+            )
 
 def main():
     # Title of the app
     st.title("Do analysis using numerical variables")
 
     # Retrieve the DataFrame from session state
-    df = st.session_state['df']
-    st.write(df.head())  # Display a preview of the DataFrame
+    df = session_dataset()
+    if df is None:
+        st.stop()
+    show_preview(df)  # Display a paginated preview of the DataFrame
 
     # Sidebar options for selecting and storing numerical columns
     st.sidebar.title("Select and Store Numerical Columns")
@@ -90,26 +144,35 @@ def main():
     select_and_store_columns(df)
 
     # Button to plot histogram plots for stored columns
-    if st.sidebar.button("Plot Histogram "):
-        plot_histogram(df)
+    if st.sidebar.button("Plot Histogram ") or refined(plot_histogram):
+        progressive_chart(plot_histogram, df)
 
     # Button to plot boxplot for stored columns
-    if st.sidebar.button("Plot Boxplot"):
-        plot_boxplot(df)
+    if st.sidebar.button("Plot Boxplot") or refined(plot_boxplot):
+        progressive_chart(plot_boxplot, df)
 
     # Button to download plots for final presentation
+    include_pdf = st.sidebar.checkbox("Include PDF")
     if st.sidebar.button("Download Plots"):
-        download_plots(df)  # Pass df to download_plots function
+        download_plots(df, include_pdf)  # Pass df to download_plots function
+
+    # Exact results of charts no longer shown are not needed anymore
+    cancel_stale_jobs()
+
+    # Timings of this rerun
+    perf_panel()
 
 if __name__ == '__main__':
+    # Time the hot path of this rerun, shown in the performance panel
+    begin_rerun()
+
     # Check if 'df' is in session state
-    if 'df' not in st.session_state:
+    if session_dataset() is None:
         # Load your DataFrame into session state (replace this with your DataFrame loading logic)
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
 
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
-            st.session_state['df'] = df
+            load_into_session(uploaded_file)
 
     # Run the main app
     main()
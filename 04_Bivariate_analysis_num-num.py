@@ -1,64 +1,86 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import base64
-from io import BytesIO
+from aggregates import bin_2d, sample_with_outliers
+from figures import figure, figure_to_png
+from dataset_cache import load_into_session, session_dataset, session_profile
+from preview import show_preview
+from pairplot import MAX_PAIRPLOT_COLUMNS, build_pairplot
+from perf import begin_rerun, perf_panel, span
+
+# Above this many rows the "Auto" scatter mode switches to a density plot
+SCATTER_MAX_POINTS = 100_000
 
 def select_and_store_columns(df):
     # Get numerical columns
-    numerical_columns = df.select_dtypes(include=['int', 'float']).columns.tolist()
+    numerical_columns = session_profile(df)['numerical_columns']
 
     # Dropdowns to choose x and y columns for scatter plot
     x_column = st.sidebar.selectbox("Select X Column", numerical_columns)
     y_column = st.sidebar.selectbox("Select Y Column", numerical_columns)
 
+    # Rendering mode for large datasets
+    mode = st.sidebar.radio("Scatter Mode", ["Auto", "All Points", "Density", "Sample"])
+
     # Button to plot individual scatter plot
     if st.sidebar.button("Plot Scatter Plot"):
-        plot_scatter_plot(df, x_column, y_column)
+        plot_scatter_plot(df, x_column, y_column, mode)
 
-def plot_scatter_plot(df, x_column, y_column):
+def plot_scatter_plot(df, x_column, y_column, mode="Auto"):
     # Plot individual scatter plot based on selected x and y columns
-    st.set_option('deprecation.showPyplotGlobalUse', False)
-    st.write(f"### Scatter Plot: {x_column} vs {y_column}")
-    plt.figure(figsize=(10, 6))
-    sns.scatterplot(x=x_column, y=y_column, data=df)
-    plt.xlabel(x_column)
-    plt.ylabel(y_column)
-
-    # Create a download link for the scatter plot
-    download_link = download_plot_as_png(plt)
-    st.markdown(download_link, unsafe_allow_html=True)
-
-    st.pyplot()
+    if mode == "Auto":
+        mode = "Density" if len(df) > SCATTER_MAX_POINTS else "All Points"
 
-def download_plot_as_png(plot):
-    # Save the plot to a BytesIO buffer as a PNG image
-    buffer = BytesIO()
-    plot.savefig(buffer, format='png')
-    buffer.seek(0)
+    # Plotting libraries are imported on first use to keep the page start fast
+    import seaborn as sns
+    from matplotlib.colors import LogNorm
 
-    # Encode the PNG image as base64 and create a download link
-    plot_base64 = base64.b64encode(buffer.getvalue()).decode()
-    download_link = f'<a href="data:image/png;base64,{plot_base64}" download="scatter_plot.png">Download Scatter Plot</a>'
-
-    return download_link
+    st.write(f"### Scatter Plot: {x_column} vs {y_column}")
+    with figure(10, 6) as fig, span('render', f"scatter ({mode})"):
+        ax = fig.subplots()
+        if mode == "Density":
+            # Aggregate the points on a grid so render time does not grow with the row count
+            with span('compute', 'bin 2d'):
+                counts, x_edges, y_edges = bin_2d(df[x_column], df[y_column])
+            counts = counts.astype('float64')
+            counts[counts == 0] = float('nan')
+            mesh = ax.pcolormesh(x_edges, y_edges, counts.T, norm=LogNorm(), cmap='viridis')
+            fig.colorbar(mesh, ax=ax, label='Count')
+            st.caption(f"Density of {len(df):,} rows")
+        elif mode == "Sample":
+            with span('compute', 'sample'):
+                sample = sample_with_outliers(df, x_column, y_column)
+            sns.scatterplot(x=x_column, y=y_column, data=sample, s=8, ax=ax)
+            st.caption(f"Random sample of {len(sample):,} of {len(df):,} rows, outliers included")
+        else:
+            sns.scatterplot(x=x_column, y=y_column, data=df, ax=ax)
+        ax.set_xlabel(x_column)
+        ax.set_ylabel(y_column)
+        png = figure_to_png(fig)
+
+    # Create a download button for the scatter plot
+    download_plot_as_png(png)
+
+    st.image(png)
+
+def download_plot_as_png(png):
+    # Offer the PNG image as a file download, without re-encoding it into the page
+    st.download_button("Download Scatter Plot", data=png, file_name='scatter_plot.png', mime='image/png', on_click='ignore')
 
 def main():
     # Title of the app
     st.title("Do Analysis using Scatter Plot")
 
     # Retrieve the DataFrame from session state
-    if 'df' not in st.session_state:
+    if session_dataset() is None:
         # Load your DataFrame into session state (replace this with your DataFrame loading logic)
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
 
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
-            st.session_state['df'] = df
+            load_into_session(uploaded_file)
 
-    df = st.session_state['df']
-    st.write(df.head())  # Display a preview of the DataFrame
+    df = session_dataset()
+    if df is None:
+        st.stop()
+    show_preview(df)  # Display a paginated preview of the DataFrame
 
     # Sidebar options for selecting x and y columns
     st.sidebar.title("Select Columns for Scatter Plot")
@@ -69,13 +91,25 @@ def main():
 
     if plot_button:
         # Select only numerical columns
-        numeric_columns = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
+        numeric_columns = session_profile(df)['numerical_columns']
+
+        # Large grids are unreadable and expensive, keep the first columns only
+        if len(numeric_columns) > MAX_PAIRPLOT_COLUMNS:
+            st.warning(
+                f"Pairplot limited to the first {MAX_PAIRPLOT_COLUMNS} of "
+                f"{len(numeric_columns)} numerical columns"
+            )
+            numeric_columns = numeric_columns[:MAX_PAIRPLOT_COLUMNS]
+
+        # Plot pairplot for all pairs of numerical columns from binned counts
+        if numeric_columns:
+            st.write("### Pairplot of Numerical Columns")
+            st.image(build_pairplot(df, numeric_columns))  # Display the plot in Streamlit
 
-        # Plot pairplot for all pairs of numerical columns
-        sns.set(style='ticks')
-        pair_plot = sns.pairplot(df[numeric_columns])
-        plt.title('Pairplot of Numerical Columns')
-        st.pyplot(pair_plot)  # Display the plot in Streamlit
+    # Timings of this rerun
+    perf_panel()
 
 if __name__ == '__main__':
+    # Time the hot path of this rerun, shown in the performance panel
+    begin_rerun()
     main()
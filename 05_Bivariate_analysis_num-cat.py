@@ -1,82 +1,181 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import base64
-from io import BytesIO
-
-# Define caching for the plotting functions
-@st.cache(show_spinner=False)
-def plot_box_plot(df, x_column, y_column, plot_width, plot_height):
-    # Plot boxplot based on selected x and y columns
-    plt.figure(figsize=(plot_width, plot_height))
-    sns.boxplot(x=x_column, y=y_column, data=df)
-    plt.xlabel(x_column)
-    plt.ylabel(y_column)
-    return plt
-
-@st.cache(show_spinner=False)
-def plot_bar_plot(df, x_column, y_column, plot_width, plot_height):
-    # Plot bar plot based on selected x and y columns
-    plt.figure(figsize=(plot_width, plot_height))
-    sns.barplot(x=x_column, y=y_column, data=df)
-    plt.xlabel(x_column)
-    plt.ylabel(y_column)
-    return plt
+from aggregates import analytic_ci, bootstrap_ci, group_box_summaries, group_stats
+from figures import render_figure
+from dataset_cache import load_into_session, session_dataset, session_profile
+from preview import show_preview
+from ingest import format_bytes
+from perf import begin_rerun, perf_panel, span
+from progressive import approximate_notice, cancel_stale_jobs, progressive_chart, progressive_result, refined
+from render_cache import render_cache
+from vega_charts import CHART_BACKEND, bar_plot, group_boxplot, show_chart
+
+# Confidence interval drawn on the bars of the bar plot
+CI_MODES = ["Analytic (standard error)", "Bootstrap", "None"]
+
+def render_box_plot(df, x_column, y_column, plot_width, plot_height):
+    # Plot boxplot based on selected x and y columns, the caller looks up and stores the rendering
+    def draw(fig):
+        import seaborn as sns
+        ax = fig.subplots()
+        sns.boxplot(x=x_column, y=y_column, data=df, ax=ax)
+        ax.set_xlabel(x_column)
+        ax.set_ylabel(y_column)
+
+    return render_figure(draw, plot_width, plot_height)
+
+def box_plot_key(dataset_fp, x_column, y_column, plot_width, plot_height):
+    # Render cache key of a box plot, None when the plot is drawn from a sample
+    return (dataset_fp, 'box', x_column, y_column, plot_width, plot_height) if dataset_fp else None
+
+def compute_bar_statistics(df, x_column, y_column, ci_mode, cancelled=None):
+    # Group means and confidence bounds of a column pair
+    stats = group_stats(df, x_column, y_column)
+    if ci_mode == "Bootstrap":
+        lower, upper = bootstrap_ci(df, x_column, y_column, cancelled=cancelled)
+        lower, upper = lower.reindex(stats.index), upper.reindex(stats.index)
+    elif ci_mode == "None":
+        lower = upper = None
+    else:
+        lower, upper = analytic_ci(stats)
+    return stats, lower, upper
+
+def bar_statistics(df, dataset_fp, x_column, y_column, ci_mode):
+    # Group means and confidence bounds, computed once per column pair and reused across plot sizes
+    cache = st.session_state.setdefault('bar_statistics', {})
+    key = (dataset_fp, x_column, y_column, ci_mode)
+    if key not in cache:
+        with span('compute', f"group statistics ({ci_mode})"):
+            cache[key] = compute_bar_statistics(df, x_column, y_column, ci_mode)
+    return cache[key]
+
+def plot_bar_plot(df, dataset_fp, x_column, y_column, plot_width, plot_height, ci_mode=CI_MODES[0], statistics=None):
+    # Plot bar plot based on selected x and y columns, reusing a cached rendering if possible
+    def draw(fig):
+        import seaborn as sns
+        stats, lower, upper = statistics or bar_statistics(df, dataset_fp, x_column, y_column, ci_mode)
+        means = stats['mean']
+        errors = None
+        if lower is not None:
+            errors = [(means - lower).to_numpy(), (upper - means).to_numpy()]
+        ax = fig.subplots()
+        colors = sns.color_palette(n_colors=len(means))
+        ax.bar(range(len(means)), means.to_numpy(), yerr=errors, color=colors, ecolor='#424242', capsize=0)
+        ax.set_xticks(range(len(means)), [str(category) for category in means.index])
+        ax.set_xlabel(x_column)
+        ax.set_ylabel(y_column)
+
+    def render():
+        return render_figure(draw, plot_width, plot_height)
+
+    key = (dataset_fp, 'bar', x_column, y_column, plot_width, plot_height, ci_mode) if dataset_fp else None
+    return render_cache.get_or_render(key, render)
 
 def main():
     # Title of the app
     st.title("Do analysis using Boxplot and Barplot")
 
     # Retrieve the DataFrame from session state
-    if 'df' not in st.session_state:
+    if session_dataset() is None:
         # Load your DataFrame into session state (replace this with your DataFrame loading logic)
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
 
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
-            st.session_state['df'] = df
+            load_into_session(uploaded_file)
 
-    df = st.session_state['df']
-    st.write(df.head())  # Display a preview of the DataFrame
+    df = session_dataset()
+    if df is None:
+        st.stop()
+    show_preview(df)  # Display a paginated preview of the DataFrame
 
     # Sidebar options for selecting x and y columns for plots
     st.sidebar.title("Select Columns for Plots")
-    categorical_columns = df.select_dtypes(include=['object']).columns.tolist()
-    numerical_columns = df.select_dtypes(include=['int', 'float']).columns.tolist()
+    categorical_columns = session_profile(df)['categorical_columns']
+    numerical_columns = session_profile(df)['numerical_columns']
 
     x_column = st.sidebar.selectbox("Select X Column", categorical_columns)
     y_column = st.sidebar.selectbox("Select Y Column", numerical_columns)
 
     plot_type = st.sidebar.radio("Select Plot Type", ["Box Plot", "Bar Plot"])
+    ci_mode = CI_MODES[0]
+    if plot_type == "Bar Plot":
+        ci_mode = st.sidebar.radio("Confidence Interval", CI_MODES)
 
     plot_width = st.sidebar.slider("Plot Width", min_value=8, max_value=20, value=10)
     plot_height = st.sidebar.slider("Plot Height", min_value=6, max_value=16, value=6)
 
     # Button to plot selected plot type
-    if st.sidebar.button(f"Plot {plot_type}"):
+    if st.sidebar.button(f"Plot {plot_type}") or refined(show_plot):
+        progressive_chart(show_plot, df, plot_type, x_column, y_column, ci_mode, plot_width, plot_height)
+
+    # Exact results of charts no longer shown are not needed anymore
+    cancel_stale_jobs()
+
+    # Render cache counters
+    stats = render_cache.stats()
+    st.sidebar.caption(
+        f"Plot cache: {stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['entries']} plots ({format_bytes(stats['bytes'])})"
+    )
+
+    # Timings of this rerun
+    perf_panel()
+
+def show_plot(df, plot_type, x_column, y_column, ci_mode, plot_width, plot_height):
+    # Draw the selected plot, from the sample of a large dataset until the exact statistics or image are ready
+    dataset_fp = st.session_state.get('dataset_fp')
+    if plot_type == "Box Plot" and CHART_BACKEND == 'vega':
+        boxes, approximate = progressive_result(
+            df, 'box plot', st.session_state.setdefault('box_statistics', {}), (dataset_fp, x_column, y_column),
+            lambda data, cancelled: group_box_summaries(data, x_column, y_column, cancelled=cancelled),
+        )
+    elif plot_type == "Box Plot":
+        # seaborn draws the box plot from the rows, so the exact image itself is rendered in the background
+        key = box_plot_key(dataset_fp, x_column, y_column, plot_width, plot_height)
+        png = render_cache.get(key) if key else None
+        approximate = False
+        if png is None:
+            def render(data, cancelled):
+                # The lookup above counted the miss, so the exact image is stored without a second lookup
+                png = render_box_plot(data, x_column, y_column, plot_width, plot_height)
+                if data is df and key is not None:
+                    render_cache.put(key, png)
+                return png
+
+            png, approximate = progressive_result(df, 'box plot', {}, key, render)
+    else:
+        statistics, approximate = progressive_result(
+            df, 'bar plot', st.session_state.setdefault('bar_statistics', {}),
+            (dataset_fp, x_column, y_column, ci_mode),
+            lambda data, cancelled: compute_bar_statistics(data, x_column, y_column, ci_mode, cancelled),
+        )
+
+    if approximate:
+        approximate_notice(df)
+    if CHART_BACKEND == 'vega':
+        # Only the aggregated statistics are sent, the browser draws the chart
         if plot_type == "Box Plot":
-            plot = plot_box_plot(df, x_column, y_column, plot_width, plot_height)
-        elif plot_type == "Bar Plot":
-            plot = plot_bar_plot(df, x_column, y_column, plot_width, plot_height)
+            show_chart(group_boxplot(boxes, x_column, y_column))
+        else:
+            show_chart(bar_plot(*statistics, x_column, y_column))
+        return
 
-        # Create a download link for the plot
-        download_link = download_plot_as_png(plot)
-        st.markdown(download_link, unsafe_allow_html=True)
+    if plot_type == "Bar Plot":
+        # Bars of the sample are not cached, the exact ones replace them shortly
+        png = plot_bar_plot(
+            df, None if approximate else dataset_fp, x_column, y_column, plot_width, plot_height, ci_mode, statistics
+        )
 
-        # Display the plot
-        st.pyplot(plot)
+    # Create a download button for the plot
+    download_plot_as_png(png)
 
-def download_plot_as_png(plot):
-    # Save the plot to a BytesIO buffer as a PNG image
-    buffer = BytesIO()
-    plot.savefig(buffer, format='png')
-    buffer.seek(0)
+    # Display the plot
+    st.image(png)
 
-    # Encode the PNG image as base64 and create a download link
-    plot_base64 = base64.b64encode(buffer.getvalue()).decode()
-    download_link = f'<a href="data:image/png;base64,{plot_base64}" download="plot.png">Download Plot</a>'
-    return download_link
+def download_plot_as_png(png):
+    # Offer the PNG image as a file download, without re-encoding it into the page
+    st.download_button("Download Plot", data=png, file_name='plot.png', mime='image/png', on_click='ignore')
 
 if __name__ == '__main__':
+    # Time the hot path of this rerun, shown in the performance panel
+    begin_rerun()
     main()
@@ -1,80 +1,201 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import base64
-from io import BytesIO
+from aggregates import crosstab
+from correlation import dataset_associations
+from figures import figure, figure_to_png
+from dataset_cache import load_into_session, session_dataset, session_profile
+from preview import show_preview
+from perf import begin_rerun, perf_panel, span
+from progressive import approximate_notice, cancel_stale_jobs, progressive_chart, progressive_result, refined
+from sampling import calibrate_counts
+from vega_charts import CHART_BACKEND, heatmap, show_chart, stacked_bar
+
+# Association measures offered by the all-pairs view
+ASSOCIATION_MEASURES = ["Cramér's V", "Theil's U"]
+
+# Heatmaps with more columns than this are drawn without the value in every cell
+ANNOTATE_MAX_COLUMNS = 20
 
 def select_and_store_columns(df):
     # Get categorical columns
-    categorical_columns = df.select_dtypes(include=['object']).columns.tolist()
+    categorical_columns = session_profile(df)['categorical_columns']
 
     # Dropdowns to choose x and y columns for stacked bar chart
     x_column = st.sidebar.selectbox("Select X Column", categorical_columns)
     y_column = st.sidebar.selectbox("Select Y Column", categorical_columns)
 
     # Button to plot stacked bar chart
-    if st.sidebar.button("Plot Stacked Bar Chart"):
-        plot_stacked_bar_chart(df, x_column, y_column)
+    if st.sidebar.button("Plot Stacked Bar Chart") or refined(plot_stacked_bar_chart):
+        progressive_chart(plot_stacked_bar_chart, df, x_column, y_column)
+
+def select_association_measure(df):
+    # Association of every pair of categorical columns, as a heatmap
+    st.sidebar.subheader("All Pairs")
+    measure = st.sidebar.radio("Association Measure", ASSOCIATION_MEASURES)
+    if st.sidebar.button("Plot All Associations") or refined(plot_all_associations):
+        progressive_chart(plot_all_associations, df, measure)
+
+def pair_counts(df, x_column, y_column, top_n):
+    # Contingency table of a column pair bucketed to its most frequent categories, computed once
+    # per dataset and bucket size, from the sample until the exact one is ready
+    cache = st.session_state.setdefault('pair_counts', {})
+    key = (st.session_state.get('dataset_fp'), x_column, y_column, top_n)
+    value_counts = session_profile(df)['value_counts'][x_column]
+    totals = value_counts.set_index(x_column)['Count']
+    totals.index = totals.index.map(str)
+
+    def calibrate(table, sample, df):
+        # The bucket of the other rows holds what the kept categories leave of the exact total
+        bucketed = totals.reindex(table.index)
+        if len(table) > top_n:
+            bucketed.iloc[-1] = totals.sum() - bucketed.iloc[:-1].sum()
+        return calibrate_counts(table, bucketed, sample, df)
+
+    return progressive_result(
+        df, 'stacked bar', cache, key, lambda data, cancelled: crosstab(data, x_column, y_column, top_n, top_n), calibrate,
+    )
 
 def plot_stacked_bar_chart(df, x_column, y_column):
     # Plot size adjustment
     plot_width = st.session_state.get('plot_width', 12)
     plot_height = st.session_state.get('plot_height', 8)
 
+    # Count table of the two columns, bucketed to the most frequent categories
+    top_n = st.session_state.get('top_n', 20)
+    table, approximate = pair_counts(df, x_column, y_column, top_n)
+
     # Plot stacked bar chart based on selected x and y columns
     st.write(f"### Stacked Bar Chart: {x_column} vs {y_column}")
-    plt.figure(figsize=(plot_width, plot_height))
-    sns.countplot(x=x_column, hue=y_column, data=df, palette='viridis')
-    plt.xlabel(x_column)
-    plt.ylabel('Count')
-
-    # Create a download link for the stacked bar chart
-    download_link = download_plot_as_png(plt)
-    st.markdown(download_link, unsafe_allow_html=True)
-
-    st.pyplot()
-
-def download_plot_as_png(plot):
-    # Save the plot to a BytesIO buffer as a PNG image
-    buffer = BytesIO()
-    plot.savefig(buffer, format='png')
-    buffer.seek(0)
-
-    # Encode the PNG image as base64 and create a download link
-    plot_base64 = base64.b64encode(buffer.getvalue()).decode()
-    download_link = f'<a href="data:image/png;base64,{plot_base64}" download="plot.png">Download Plot</a>'
-    
-    return download_link
+    if approximate:
+        approximate_notice(df)
+    if CHART_BACKEND == 'vega':
+        # Only the bucketed counts are sent, the browser draws the chart
+        show_chart(stacked_bar(table, x_column, y_column))
+        return
+
+    with figure(plot_width, plot_height) as fig, span('render', 'stacked bar'):
+        ax = fig.subplots()
+        table.plot(kind='bar', stacked=True, colormap='viridis', width=0.8, ax=ax)
+        ax.set_xlabel(x_column)
+        ax.set_ylabel('Count')
+        ax.legend(title=y_column)
+        png = figure_to_png(fig)
+
+    # Create a download button for the stacked bar chart
+    download_plot_as_png(png)
+
+    st.image(png)
+
+def progressive_associations(df):
+    # Association matrices of all categorical columns, computed once per dataset,
+    # from the sample of a large dataset until the exact ones are ready
+    dataset_fp = st.session_state.get('dataset_fp')
+    columns = session_profile(df)['categorical_columns']
+
+    def compute(data, cancelled):
+        # Only the full dataset is cached
+        return dataset_associations(data, dataset_fp if data is df else None, columns, cancelled)
+
+    cache = st.session_state.setdefault('association_matrices', {})
+    return progressive_result(df, 'association matrix', cache, dataset_fp, compute)
+
+def plot_all_associations(df, measure):
+    """
+    Plot the association of every pair of categorical columns in the DataFrame as a heatmap.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing categorical columns.
+    measure (str): One of ASSOCIATION_MEASURES.
+
+    Returns:
+    None
+    """
+    if len(session_profile(df)['categorical_columns']) < 2:
+        st.warning("At least two categorical columns are needed")
+        return
+
+    # Both measures come from the same contingency tables, so switching measure hits the cache
+    matrices, approximate = progressive_associations(df)
+    association_matrix = matrices[measure]
+    if approximate:
+        approximate_notice(df)
+
+    title = f"{measure} for All Categorical Columns"
+    if measure == "Theil's U":
+        st.caption("Asymmetric: each cell tells how much the column explains the row, from 0 to 1")
+    annotate = len(association_matrix) <= ANNOTATE_MAX_COLUMNS
+    if CHART_BACKEND == 'vega':
+        # Only the cells of the matrix are sent, the browser draws the heatmap
+        show_chart(heatmap(association_matrix, title, annotate, sequential=True))
+        return
+
+    # Set up the matplotlib figure, importing seaborn on first use to keep the page start fast
+    import seaborn as sns
+    with figure(10, 8) as fig:
+        ax = fig.subplots()
+
+        # Plot the heatmap
+        with span('render', 'heatmap'):
+            sns.heatmap(
+                association_matrix, annot=annotate, cmap='Blues', vmin=0, vmax=1, fmt='.2f',
+                linewidths=0.5 if annotate else 0, ax=ax,
+            )
+
+        # Customize the plot
+        ax.set_title(title)
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.tick_params(axis='y', labelrotation=0)
+        fig.tight_layout()
+
+        # Show the plot using Streamlit's pyplot
+        with span('encode', 'st.pyplot'):
+            st.pyplot(fig)
+
+def download_plot_as_png(png):
+    # Offer the PNG image as a file download, without re-encoding it into the page
+    st.download_button("Download Plot", data=png, file_name='plot.png', mime='image/png', on_click='ignore')
 
 def main():
     # Title of the app
     st.title("Do analysis using Stacked bar chart")
 
     # Retrieve the DataFrame from session state
-    if 'df' not in st.session_state:
+    if session_dataset() is None:
         # Load your DataFrame into session state (replace this with your DataFrame loading logic)
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
 
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
-            st.session_state['df'] = df
+            load_into_session(uploaded_file)
 
-    df = st.session_state['df']
-    st.write(df.head())  # Display a preview of the DataFrame
+    df = session_dataset()
+    if df is None:
+        st.stop()
+    show_preview(df)  # Display a paginated preview of the DataFrame
 
     # Sidebar options for selecting x and y columns for stacked bar chart
     st.sidebar.title("Select Columns for Stacked Bar Chart")
     select_and_store_columns(df)
+    select_association_measure(df)
 
     # Slider to adjust plot size
     st.sidebar.subheader("Adjust Plot Size")
     plot_width = st.sidebar.slider("Width", min_value=8, max_value=20, value=12)
     plot_height = st.sidebar.slider("Height", min_value=6, max_value=16, value=8)
     
+    # Number of categories shown per column, the others are grouped into one "Other" bucket
+    top_n = st.sidebar.slider("Top Categories", min_value=2, max_value=50, value=20)
+
     # Store plot size in session state
     st.session_state['plot_width'] = plot_width
     st.session_state['plot_height'] = plot_height
+    st.session_state['top_n'] = top_n
+
+    # Exact results of charts no longer shown are not needed anymore
+    cancel_stale_jobs()
+
+    # Timings of this rerun
+    perf_panel()
 
 if __name__ == '__main__':
+    # Time the hot path of this rerun, shown in the performance panel
+    begin_rerun()
     main()
@@ -1,7 +1,60 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+from correlation import (
+    HEATMAP_MAX_SIZE, WIDE_CORRELATION_COLUMNS, cluster_order, dataset_correlation, downsample_matrix, top_pairs,
+    wide_correlation,
+)
+from dataset_cache import cache_path, load_into_session, session_dataset, session_profile
+from figures import figure
+from perf import begin_rerun, perf_panel, span
+from progressive import approximate_notice, cancel_stale_jobs, progressive_chart, progressive_result, refined
+from vega_charts import CHART_BACKEND, heatmap, show_chart
+
+# Heatmaps with more columns than this are drawn without the value in every cell
+ANNOTATE_MAX_COLUMNS = 20
+
+# Heatmaps with more columns than this are drawn without column labels
+LABEL_MAX_COLUMNS = 60
+
+def numerical_correlations(df, columns=None):
+    # Correlation matrix of the numerical columns, computed once per dataset from the cached Parquet file
+    dataset_fp = st.session_state.get('dataset_fp')
+    path = cache_path(dataset_fp) if dataset_fp else None
+    if columns is None:
+        columns = session_profile(df)['numerical_columns']
+    with span('compute', 'correlation matrix'):
+        return dataset_correlation(df, dataset_fp, columns, path)
+
+def progressive_correlations(df):
+    # Correlation matrix of all numerical columns, block-wise in float32 for wide tables,
+    # from the sample of a large dataset until the exact one is ready
+    dataset_fp = st.session_state.get('dataset_fp')
+    path = cache_path(dataset_fp) if dataset_fp else None
+    profile = session_profile(df)
+    columns = profile['numerical_columns']
+    wide = len(columns) > WIDE_CORRELATION_COLUMNS
+
+    def compute(data, cancelled):
+        # Only the full dataset is cached and streamed from its Parquet file
+        exact = data is df
+        if wide:
+            pairwise = any(profile['columns'][column]['nulls'] for column in columns)
+            stats = profile['numeric_stats'] if exact else None
+            return wide_correlation(
+                data, dataset_fp if exact else None, columns, stats, pairwise, path if exact else None, cancelled
+            )
+        return dataset_correlation(data, dataset_fp if exact else None, columns, path if exact else None, cancelled)
+
+    cache = st.session_state.setdefault('correlation_matrices', {})
+    return progressive_result(df, 'correlation matrix', cache, (dataset_fp, wide), compute)
+
+def clustered_order(df, correlation_matrix):
+    # Column order grouping correlated columns, computed once per dataset
+    cache = st.session_state.setdefault('correlation_order', {})
+    key = st.session_state.get('dataset_fp')
+    if key not in cache:
+        with span('compute', 'clustered order'):
+            cache[key] = cluster_order(correlation_matrix)
+    return cache[key]
 
 def plot_correlation_matrix(df, x_column, y_column):
     """
@@ -15,26 +68,42 @@ def plot_correlation_matrix(df, x_column, y_column):
     Returns:
     None
     """
-    # Create a subset DataFrame with selected x and y columns
-    subset_df = df[[x_column, y_column]]
-
-    # Compute the correlation matrix
-    correlation_matrix = subset_df.corr()
+    # Read the selected x and y columns from the cached correlation matrix. Wide tables only
+    # correlate the pair until the exact wide matrix has been computed for "Plot All Correlations"
+    if len(session_profile(df)['numerical_columns']) > WIDE_CORRELATION_COLUMNS:
+        wide_matrix = st.session_state.get('correlation_matrices', {}).get((st.session_state.get('dataset_fp'), True))
+        if wide_matrix is None:
+            wide_matrix = numerical_correlations(df, list(dict.fromkeys([x_column, y_column])))
+        correlation_matrix = wide_matrix.loc[[x_column, y_column], [x_column, y_column]]
+    else:
+        correlation_matrix, approximate = progressive_correlations(df)
+        correlation_matrix = correlation_matrix.loc[[x_column, y_column], [x_column, y_column]]
+        if approximate:
+            approximate_notice(df)
+    title = f'Correlation Matrix: {x_column} vs {y_column}'
+    if CHART_BACKEND == 'vega':
+        # Only the cells of the matrix are sent, the browser draws the heatmap
+        show_chart(heatmap(correlation_matrix, title))
+        return
 
-    # Set up the matplotlib figure
-    plt.figure(figsize=(8, 6))
+    # Set up the matplotlib figure, importing seaborn on first use to keep the page start fast
+    import seaborn as sns
+    with figure(8, 6) as fig:
+        ax = fig.subplots()
 
-    # Plot the heatmap
-    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5)
+        # Plot the heatmap
+        with span('render', 'heatmap'):
+            sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5, ax=ax)
 
-    # Customize the plot
-    plt.title(f'Correlation Matrix: {x_column} vs {y_column}')
-    plt.xticks(rotation=45)
-    plt.yticks(rotation=0)
-    plt.tight_layout()
+        # Customize the plot
+        ax.set_title(title)
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.tick_params(axis='y', labelrotation=0)
+        fig.tight_layout()
 
-    # Show the plot using Streamlit's pyplot
-    st.pyplot()
+        # Show the plot using Streamlit's pyplot
+        with span('encode', 'st.pyplot'):
+            st.pyplot(fig)
 
 def plot_all_correlations(df):
     """
@@ -47,32 +116,112 @@ def plot_all_correlations(df):
     None
     """
     # Compute the correlation matrix for all numerical columns
-    correlation_matrix = df.select_dtypes(include=['int', 'float']).corr()
+    correlation_matrix, approximate = progressive_correlations(df)
+    if approximate:
+        approximate_notice(df)
+
+    # Tables with many columns get the ranked pairs and a clustered, downsampled heatmap
+    if len(correlation_matrix) > WIDE_CORRELATION_COLUMNS:
+        plot_wide_correlations(df, correlation_matrix, approximate)
+        return
+
+    title = 'Correlation Matrix for All Numerical Columns'
+    annotate = len(correlation_matrix) <= ANNOTATE_MAX_COLUMNS
+    if CHART_BACKEND == 'vega':
+        # Only the cells of the matrix are sent, the browser draws the heatmap
+        show_chart(heatmap(correlation_matrix, title, annotate))
+        return
+
+    # Set up the matplotlib figure, importing seaborn on first use to keep the page start fast
+    import seaborn as sns
+    with figure(10, 8) as fig:
+        ax = fig.subplots()
+
+        # Plot the heatmap
+        with span('render', 'heatmap'):
+            sns.heatmap(
+                correlation_matrix, annot=annotate, cmap='coolwarm', fmt='.2f',
+                linewidths=0.5 if annotate else 0, ax=ax,
+            )
+
+        # Customize the plot
+        ax.set_title(title)
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.tick_params(axis='y', labelrotation=0)
+        fig.tight_layout()
+
+        # Show the plot using Streamlit's pyplot
+        with span('encode', 'st.pyplot'):
+            st.pyplot(fig)
+
+def plot_wide_correlations(df, correlation_matrix, approximate=False):
+    """
+    Show the strongest pairs and a clustered heatmap for tables with many numerical columns.
+
+    The matrix is computed block-wise in float32, the columns are ordered so
+    that correlated columns sit together, and the heatmap is block averaged
+    down to at most HEATMAP_MAX_SIZE rows and columns.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing numerical columns.
+    correlation_matrix (pd.DataFrame): The correlation matrix of its numerical columns.
+    approximate (bool): Whether the matrix comes from the sample.
 
-    # Set up the matplotlib figure
-    plt.figure(figsize=(10, 8))
+    Returns:
+    None
+    """
 
-    # Plot the heatmap
-    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5)
+    # Ranked table of the most strongly correlated pairs
+    k = st.session_state.get('top_pairs', 50)
+    st.write(f"### Top {k} Correlated Pairs")
+    with span('compute', 'top pairs'):
+        pairs = top_pairs(correlation_matrix, k)
+    st.dataframe(pairs, hide_index=True)
 
-    # Customize the plot
-    plt.title('Correlation Matrix for All Numerical Columns')
-    plt.xticks(rotation=45)
-    plt.yticks(rotation=0)
-    plt.tight_layout()
+    # Clustered heatmap, block averaged when there are more columns than pixels worth drawing
+    order = cluster_order(correlation_matrix) if approximate else clustered_order(df, correlation_matrix)
+    with span('compute', 'downsample heatmap'):
+        cells = downsample_matrix(correlation_matrix.iloc[order, order], HEATMAP_MAX_SIZE)
+    title = f'Clustered Correlation Matrix of {len(correlation_matrix)} Numerical Columns'
+    if len(cells) < len(correlation_matrix):
+        st.caption(f"Each cell averages a block of about {len(correlation_matrix) / len(cells):.1f} columns")
+    if CHART_BACKEND == 'vega':
+        # Only the block averages are sent, the browser draws the heatmap
+        show_chart(heatmap(cells, title, annotate=False))
+        return
 
-    # Show the plot using Streamlit's pyplot
-    st.pyplot()
+    with figure(10, 8) as fig:
+        ax = fig.subplots()
+
+        # A single image instead of one patch per cell keeps rendering fast for large matrices
+        with span('render', 'heatmap'):
+            image = ax.imshow(cells.to_numpy(), cmap='coolwarm', vmin=-1, vmax=1, interpolation='nearest')
+            fig.colorbar(image, ax=ax)
+            if len(cells) <= LABEL_MAX_COLUMNS:
+                ax.set_xticks(range(len(cells)), cells.columns, rotation=90)
+                ax.set_yticks(range(len(cells)), cells.index)
+            else:
+                ax.set_xticks([])
+                ax.set_yticks([])
+
+        ax.set_title(title)
+        fig.tight_layout()
+
+        # Show the plot using Streamlit's pyplot
+        with span('encode', 'st.pyplot'):
+            st.pyplot(fig)
 
 def main():
     # Title of the app
     st.title("Correlation Matrix Analysis")
 
     # Retrieve the DataFrame from session state
-    df = st.session_state['df']
+    df = session_dataset()
+    if df is None:
+        st.stop()
 
     # Select numerical columns
-    numerical_columns = df.select_dtypes(include=['int', 'float']).columns.tolist()
+    numerical_columns = session_profile(df)['numerical_columns']
 
     # Sidebar for selecting x and y columns
     st.sidebar.title("Select Columns")
@@ -80,22 +229,34 @@ def main():
     y_column = st.sidebar.selectbox("Select Y Column", numerical_columns)
 
     # Button to plot correlation matrix for selected x and y columns
-    if st.sidebar.button("Plot Correlation Matrix"):
-        plot_correlation_matrix(df, x_column, y_column)
+    if st.sidebar.button("Plot Correlation Matrix") or refined(plot_correlation_matrix):
+        progressive_chart(plot_correlation_matrix, df, x_column, y_column)
+
+    # Number of ranked pairs shown for tables with many columns
+    if len(numerical_columns) > WIDE_CORRELATION_COLUMNS:
+        st.session_state['top_pairs'] = st.sidebar.slider("Top Pairs", min_value=10, max_value=500, value=50)
 
     # Button to plot correlation matrix for all numerical columns
-    if st.sidebar.button("Plot All Correlations"):
-        plot_all_correlations(df)
+    if st.sidebar.button("Plot All Correlations") or refined(plot_all_correlations):
+        progressive_chart(plot_all_correlations, df)
+
+    # Exact results of charts no longer shown are not needed anymore
+    cancel_stale_jobs()
+
+    # Timings of this rerun
+    perf_panel()
 
 if __name__ == '__main__':
+    # Time the hot path of this rerun, shown in the performance panel
+    begin_rerun()
+
     # Check if 'df' is in session state
-    if 'df' not in st.session_state:
+    if session_dataset() is None:
         # Load your DataFrame into session state (replace this with your DataFrame loading logic)
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
 
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
-            st.session_state['df'] = df
+            load_into_session(uploaded_file)
 
     # Run the main app
     main()
@@ -1,5 +1,9 @@
 import streamlit as st
-import pandas as pd
+from dataset_cache import DATA_DIR, load_into_session, load_local
+from dataset_registry import get_registry
+from perf import begin_rerun, perf_panel
+from preview import show_preview
+from warmup import start_warmup
 
 
 st.set_page_config(
@@ -7,13 +11,107 @@ st.set_page_config(
     page_icon="👋",
 )
 
-import streamlit as st
+# Import pandas, matplotlib and friends in the background while the first page renders
+start_warmup()
+
+# Time the hot path of this rerun, shown in the performance panel
+begin_rerun()
+
 st.title('Hi buddy, Welcome and All the best for the  most important step of EDA ')
 st.header("Convert your file into comma(,) separated form")
 
+def read_csv(file, separator=','):
+    # Read the CSV in chunks with compact dtypes, showing progress and the memory saved
+    from ingest import format_bytes, read_csv_chunked
+
+    progress_bar = st.progress(0.0, text="Reading file...")
+    df, raw_bytes, compact_bytes = read_csv_chunked(
+        file, sep=separator, progress=lambda fraction: progress_bar.progress(fraction, text="Reading file...")
+    )
+    progress_bar.empty()
+    st.caption(
+        f"Memory usage: {format_bytes(compact_bytes)} "
+        f"(saved {format_bytes(raw_bytes - compact_bytes)} compared to default dtypes)"
+    )
+    return df
+
+def read_excel(file, sheet):
+    # Read one sheet of the workbook with compact dtypes, showing progress and the memory saved
+    from ingest import format_bytes, read_excel_sheet
+
+    progress_bar = st.progress(0.0, text="Reading sheet...")
+    df, raw_bytes, compact_bytes = read_excel_sheet(
+        file, sheet, progress=lambda fraction: progress_bar.progress(fraction, text="Reading sheet...")
+    )
+    progress_bar.empty()
+    st.caption(
+        f"Memory usage: {format_bytes(compact_bytes)} "
+        f"(saved {format_bytes(raw_bytes - compact_bytes)} compared to default dtypes)"
+    )
+    return df
+
+def excel_sheets(file):
+    # List the sheets once per uploaded workbook, picking another sheet does not reopen it
+    from ingest import excel_sheet_names
+
+    file_id = getattr(file, 'file_id', None) or (file.name, file.size)
+    stored = st.session_state.get('excel_sheets')
+    if stored is None or stored[0] != file_id:
+        stored = (file_id, excel_sheet_names(file))
+        st.session_state['excel_sheets'] = stored
+    return stored[1]
+
+def load_csv(file, separator=','):
+    # Parse the CSV only if this content is not in the dataset cache yet
+    return load_into_session(file, lambda file: read_csv(file, separator), separator)
+
+def open_local_file():
+    # Pick a file of the server data directory and open it in place, nothing goes through the browser
+    from ingest import list_local_files, resolve_local_path
+
+    names = list_local_files(DATA_DIR)
+    if not names:
+        st.info(f"No CSV, Arrow, Feather or Parquet files in {DATA_DIR}")
+        return None
+    # No file is preselected, opening a large CSV the first time converts it
+    name = st.selectbox("File", names, index=None, placeholder="Choose a file")
+    if name is None:
+        return None
+    separator = ','
+    if name.lower().endswith(('.csv', '.tsv', '.txt')):
+        separator = st.text_input("Separator (e.g., ',', ';')", '\t' if name.lower().endswith('.tsv') else ',')
+        if separator == '':
+            separator = ','
+        elif separator == '\\t':
+            separator = '\t'
+
+    progress_bar = st.progress(0.0, text="Opening file...")
+    try:
+        df = load_local(
+            resolve_local_path(DATA_DIR, name), separator,
+            progress=lambda fraction: progress_bar.progress(fraction, text="Converting CSV..."),
+        )
+    except (OSError, ValueError) as error:
+        st.error(f"Could not open {name}: {error}")
+        return None
+    finally:
+        progress_bar.empty()
+    return df
+
 def main():
     st.subheader("CSV/Excel File Reader")
 
+    # Files already on the server are opened from the data directory instead of being uploaded
+    source = "Upload file"
+    if DATA_DIR:
+        source = st.radio("Data source", ["Upload file", "Server data directory"], horizontal=True)
+    if source == "Server data directory":
+        df = open_local_file()
+        if df is not None:
+            st.write("### DataFrame")
+            show_preview(df, key='menu_preview')
+        return
+
     # File upload and parameter selection
     file = st.file_uploader("Upload file", type=["csv", "xlsx"])
     if file is not None:
@@ -26,17 +124,24 @@ def main():
                 separator = ','
             
             # Read CSV file
-            df = pd.read_csv(file, sep=separator)
+            if st.checkbox("Compact dtypes (chunked read)", value=True):
+                df = load_csv(file, separator)
+            else:
+                import pandas as pd
+
+                df = load_into_session(file, lambda file: pd.read_csv(file, sep=separator), separator, 'default dtypes')
         elif file_extension == "xlsx":
-            # Read Excel file
-            df = pd.read_excel(file, engine='openpyxl')
+            # Read the selected sheet, converted once into the dataset cache
+            sheets = excel_sheets(file)
+            sheet = st.selectbox("Sheet", sheets) if len(sheets) > 1 else sheets[0]
+            df = load_into_session(file, lambda file: read_excel(file, sheet), 'xlsx', sheet)
         else:
             st.error("Unsupported file type. Please upload a CSV or Excel file.")
             return
 
-        # Display DataFrame
+        # Display a paginated preview, only the visible rows are sent to the browser
         st.write("### DataFrame")
-        st.write(df)
+        show_preview(df, key='menu_preview')
 
         # Optionally, you can save the DataFrame to a CSV file
         if st.button("Save DataFrame as CSV"):
@@ -54,5 +159,19 @@ st.write('Now upload your comma separated file')
 file = st.file_uploader("Upload CSV or Excel file", type=['csv', 'xlsx'])
 
 if file is not None:
-    df=pd.read_csv(file)
-    st.session_state['df']=df
\ No newline at end of file
+    df=load_csv(file)
+
+# Admin view of the datasets shared by all sessions, opened with ?admin=1
+if st.query_params.get('admin') == '1':
+    from ingest import format_bytes
+
+    registry = get_registry()
+    st.write("### Resident Datasets")
+    st.caption(
+        f"{format_bytes(registry.total_bytes())} in memory, "
+        f"unreferenced datasets are evicted above {format_bytes(registry.max_bytes)}"
+    )
+    st.dataframe(registry.stats())
+
+# Timings of this rerun
+perf_panel()
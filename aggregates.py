@@ -0,0 +1,341 @@
+from concurrent.futures import CancelledError
+
+import numpy as np
+import pandas as pd
+
+# Bin rule shared by every histogram, and the largest number of bins it may produce
+HISTOGRAM_BINS = 'auto'
+MAX_HISTOGRAM_BINS = 200
+
+# Number of outliers kept per boxplot, the others are sampled away
+MAX_BOXPLOT_OUTLIERS = 1000
+
+
+def check_cancelled(cancelled):
+    # Stops a background computation between two chunks once its job is cancelled
+    if cancelled is not None and cancelled.is_set():
+        raise CancelledError()
+
+
+def bin_2d(x, y, bins=200):
+    """
+    Count the points of two numerical columns on a regular 2D grid.
+
+    Parameters:
+    x (pd.Series): Values of the x column.
+    y (pd.Series): Values of the y column.
+    bins (int): Number of bins along each axis.
+
+    Returns:
+    tuple: The (bins, bins) count array indexed by [x bin, y bin], the x bin edges and the y bin edges.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    valid = np.isfinite(x) & np.isfinite(y)
+    x = x[valid]
+    y = y[valid]
+    if len(x) == 0:
+        return np.zeros((bins, bins), dtype='int64'), np.linspace(0, 1, bins + 1), np.linspace(0, 1, bins + 1)
+
+    x_edges = np.linspace(x.min(), x.max() if x.max() > x.min() else x.min() + 1, bins + 1)
+    y_edges = np.linspace(y.min(), y.max() if y.max() > y.min() else y.min() + 1, bins + 1)
+
+    # Map every point to its cell and count all cells with a single bincount
+    x_index = np.minimum(((x - x_edges[0]) / (x_edges[-1] - x_edges[0]) * bins).astype('int64'), bins - 1)
+    y_index = np.minimum(((y - y_edges[0]) / (y_edges[-1] - y_edges[0]) * bins).astype('int64'), bins - 1)
+    counts = np.bincount(x_index * bins + y_index, minlength=bins * bins).reshape(bins, bins)
+    return counts, x_edges, y_edges
+
+
+def outlier_mask(values, whisker=1.5):
+    # Points beyond the boxplot whiskers (Q1 - 1.5 IQR, Q3 + 1.5 IQR)
+    values = np.asarray(values, dtype='float64')
+    q1, q3 = np.nanpercentile(values, [25, 75])
+    iqr = q3 - q1
+    return (values < q1 - whisker * iqr) | (values > q3 + whisker * iqr)
+
+
+def sample_with_outliers(df, x_column, y_column, n=50_000, max_outliers=10_000, seed=0):
+    """
+    Draw a random subsample of two columns that keeps the outliers of both.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    x_column (str): The x column.
+    y_column (str): The y column.
+    n (int): Number of randomly sampled rows.
+    max_outliers (int): Maximum number of outlier rows added to the sample.
+    seed (int): Seed of the random generator, so reruns draw the same sample.
+
+    Returns:
+    pd.DataFrame: The sampled rows of the two columns, a single column if they are the same.
+    """
+    # The same column on both axes is selected once, duplicate labels would make data[x_column] a frame
+    data = df[list(dict.fromkeys([x_column, y_column]))].dropna()
+    if len(data) <= n:
+        return data
+
+    rng = np.random.default_rng(seed)
+    mask = outlier_mask(data[x_column])
+    if y_column != x_column:
+        mask |= outlier_mask(data[y_column])
+    outliers = np.flatnonzero(mask)
+    if len(outliers) > max_outliers:
+        outliers = rng.choice(outliers, max_outliers, replace=False)
+    sample = rng.choice(len(data), n, replace=False)
+    rows = np.union1d(sample, outliers)
+    return data.iloc[rows]
+
+
+def histogram_summary(values, bins=HISTOGRAM_BINS):
+    """
+    Bin a numerical column once so its histogram can be redrawn without the raw values.
+
+    Parameters:
+    values (pd.Series): The column.
+    bins: Any bin rule accepted by np.histogram_bin_edges.
+
+    Returns:
+    tuple: The counts and the bin edges.
+    """
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return np.zeros(1, dtype='int64'), np.array([0.0, 1.0])
+    edges = np.histogram_bin_edges(values, bins=bins)
+    if len(edges) > MAX_HISTOGRAM_BINS + 1:
+        edges = np.histogram_bin_edges(values, bins=MAX_HISTOGRAM_BINS)
+    counts, edges = np.histogram(values, bins=edges)
+    return counts, edges
+
+
+def box_summary(values, quartiles, label, max_outliers=MAX_BOXPLOT_OUTLIERS, seed=0):
+    """
+    Summarize a numerical column into the statistics drawn by a boxplot.
+
+    Parameters:
+    values (pd.Series): The column.
+    quartiles (tuple): Its first quartile, median and third quartile.
+    label (str): The label of the box.
+    max_outliers (int): Maximum number of outliers kept.
+    seed (int): Seed of the random generator sampling the outliers.
+
+    Returns:
+    dict: Statistics in the format expected by matplotlib's Axes.bxp.
+    """
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    q1, median, q3 = quartiles
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    if len(outliers) > max_outliers:
+        # Keep the extremes so the sampled plot spans the same range
+        sampled = np.random.default_rng(seed).choice(outliers, max_outliers - 2, replace=False)
+        outliers = np.concatenate([[outliers.min(), outliers.max()], sampled])
+    return {
+        'label': label,
+        'q1': q1,
+        'med': median,
+        'q3': q3,
+        'whislo': inside.min() if len(inside) else q1,
+        'whishi': inside.max() if len(inside) else q3,
+        'fliers': outliers,
+    }
+
+
+def numeric_summaries(df, columns, cancelled=None):
+    """
+    Compute the histogram and boxplot summaries of several numerical columns.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    columns (list): The numerical columns.
+    cancelled (threading.Event): Optional event stopping the computation between two columns.
+
+    Returns:
+    dict: Maps every column to a dict with its 'hist' (counts, edges) and 'box' statistics.
+    """
+    if not columns:
+        return {}
+    # Quartiles of all columns in a single call
+    quartiles = df[columns].quantile([0.25, 0.5, 0.75])
+    summaries = {}
+    for column in columns:
+        check_cancelled(cancelled)
+        values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        summaries[column] = {
+            'hist': histogram_summary(values),
+            'box': box_summary(values, tuple(quartiles[column]), column),
+        }
+    return summaries
+
+
+def group_stats(df, x_column, y_column):
+    """
+    Compute the mean, count and variance of a numerical column per category in one groupby pass.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    x_column (str): The categorical column.
+    y_column (str): The numerical column.
+
+    Returns:
+    pd.DataFrame: One row per category with 'mean', 'count' and 'var' columns.
+    """
+    categorical = isinstance(df[x_column].dtype, pd.CategoricalDtype)
+    return df.groupby(x_column, observed=True, sort=categorical)[y_column].agg(['mean', 'count', 'var'])
+
+
+def group_box_summaries(df, x_column, y_column, max_outliers=MAX_BOXPLOT_OUTLIERS, cancelled=None):
+    """
+    Compute the boxplot statistics of a numerical column per category.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    x_column (str): The categorical column.
+    y_column (str): The numerical column.
+    max_outliers (int): Maximum number of outliers kept per category.
+    cancelled (threading.Event): Optional event stopping the computation between two categories.
+
+    Returns:
+    list: One dict per category in the format expected by matplotlib's Axes.bxp.
+    """
+    categorical = isinstance(df[x_column].dtype, pd.CategoricalDtype)
+    groups = df.groupby(x_column, observed=True, sort=categorical)[y_column]
+    # Quartiles of all categories in a single call
+    quartiles = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    summaries = []
+    for category, values in groups:
+        check_cancelled(cancelled)
+        if category in quartiles.index and np.isfinite(quartiles.loc[category]).all():
+            summaries.append(box_summary(
+                values.to_numpy(dtype='float64', na_value=np.nan), tuple(quartiles.loc[category]), category, max_outliers
+            ))
+    return summaries
+
+
+def analytic_ci(stats, z=1.96):
+    # Normal approximation of the 95% confidence interval: mean +/- z standard errors
+    error = z * np.sqrt(stats['var'].fillna(0) / stats['count'])
+    return stats['mean'] - error, stats['mean'] + error
+
+
+def bootstrap_ci(df, x_column, y_column, n_boot=1000, ci=95, seed=0, max_block=20_000_000, cancelled=None):
+    """
+    Bootstrap the confidence interval of the mean of each category with batched NumPy resampling.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    x_column (str): The categorical column.
+    y_column (str): The numerical column.
+    n_boot (int): Number of bootstrap resamples.
+    ci (float): Width of the interval in percent.
+    seed (int): Seed of the random generator.
+    max_block (int): Largest number of resampled values held in memory at once.
+    cancelled (threading.Event): Optional event stopping the computation between two categories.
+
+    Returns:
+    tuple: The lower and upper bounds as Series indexed by category.
+    """
+    rng = np.random.default_rng(seed)
+    categorical = isinstance(df[x_column].dtype, pd.CategoricalDtype)
+    lower = {}
+    upper = {}
+    for category, values in df.groupby(x_column, observed=True, sort=categorical)[y_column]:
+        check_cancelled(cancelled)
+        values = values.dropna().to_numpy(dtype='float64')
+        if len(values) == 0:
+            lower[category] = upper[category] = np.nan
+            continue
+        # All resamples of a category are drawn as one index matrix, split only for very large groups
+        batch = max(1, min(n_boot, max_block // len(values)))
+        means = np.concatenate([
+            values[rng.integers(0, len(values), size=(min(batch, n_boot - start), len(values)))].mean(axis=1)
+            for start in range(0, n_boot, batch)
+        ])
+        lower[category], upper[category] = np.percentile(means, [(100 - ci) / 2, 100 - (100 - ci) / 2])
+    return pd.Series(lower), pd.Series(upper)
+
+
+def category_codes(series):
+    """
+    Encode a categorical column as integer codes.
+
+    Parameters:
+    series (pd.Series): The column.
+
+    Returns:
+    tuple: The codes (-1 for missing values) and the categories they index.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, categories = pd.factorize(series, sort=True)
+    return codes, categories
+
+
+def _bucket_codes(codes, n_categories, n):
+    # Positions of the n most frequent categories, most frequent first, with the
+    # others sharing the next position, and how many categories share it.
+    # Without n every category that occurs is kept, in category order.
+    counts = np.bincount(codes, minlength=n_categories)
+    if n is None:
+        kept = np.flatnonzero(counts)
+    else:
+        order = np.argsort(-counts, kind='stable')
+        kept = order[:min(n, np.count_nonzero(counts))]
+    positions = np.full(n_categories, len(kept), dtype='int64')
+    positions[kept] = np.arange(len(kept))
+    return positions[codes], kept, np.count_nonzero(counts) - len(kept)
+
+
+def _bucket_labels(categories, kept, rest, other):
+    # Labels of the kept categories and of the bucket, which must not be one of them
+    labels = [str(category) for category in categories[kept]]
+    if rest:
+        label = f"{other} ({rest} categories)"
+        while label in labels:
+            label += ' '
+        labels.append(label)
+    return labels
+
+
+def crosstab(df, x_column, y_column, n_rows=None, n_columns=None, other='Other'):
+    """
+    Count the rows of every pair of categories with a single bincount over combined codes.
+
+    With n_rows and n_columns, only the most frequent categories of each
+    column get their own row or column and the others are counted in one
+    bucket, before counting. The table never holds more cells than it shows,
+    whatever the number of categories.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    x_column (str): The categorical column of the rows of the table.
+    y_column (str): The categorical column of the columns of the table.
+    n_rows (int): Number of row categories kept, all of them if None.
+    n_columns (int): Number of column categories kept, all of them if None.
+    other (str): Label of the buckets, followed by the number of categories they hold.
+
+    Returns:
+    pd.DataFrame: The contingency table, without categories that never occur. Kept
+    categories are ordered by frequency and labelled as strings when bucketed.
+    """
+    x_codes, x_categories = category_codes(df[x_column])
+    y_codes, y_categories = category_codes(df[y_column])
+    valid = (x_codes >= 0) & (y_codes >= 0)
+    x_positions, x_kept, x_rest = _bucket_codes(x_codes[valid], len(x_categories), n_rows)
+    y_positions, y_kept, y_rest = _bucket_codes(y_codes[valid], len(y_categories), n_columns)
+    n_x = len(x_kept) + bool(x_rest)
+    n_y = len(y_kept) + bool(y_rest)
+    counts = np.bincount(x_positions * n_y + y_positions, minlength=n_x * n_y)
+    if n_rows is None and n_columns is None:
+        index, columns = x_categories[x_kept], y_categories[y_kept]
+    else:
+        index = _bucket_labels(x_categories, x_kept, x_rest, other)
+        columns = _bucket_labels(y_categories, y_kept, y_rest, other)
+    return pd.DataFrame(
+        counts.reshape(n_x, n_y),
+        index=pd.Index(index, name=x_column),
+        columns=pd.Index(columns, name=y_column),
+    )
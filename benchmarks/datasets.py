@@ -0,0 +1,101 @@
+"""
+Generate synthetic datasets for the benchmarks.
+
+The datasets mix numerical columns (normal, skewed, integer and correlated,
+with a few missing values) and categorical columns whose cardinality is set
+per column. Categorical columns are generated as 'category' dtype, the way
+ingest.shrink_dtypes stores low-cardinality text after an upload.
+
+Usage:
+python benchmarks/datasets.py --rows 1000000 [--numeric 6] [--cardinality 5,50,500,5000] [--out data.parquet]
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Default cardinality of each categorical column
+CARDINALITIES = (5, 50, 500, 5000)
+
+# Where generated datasets are kept between benchmark runs
+DATA_DIR = os.environ.get('EDA_BENCHMARK_DATA', os.path.join(tempfile.gettempdir(), 'eda-benchmarks'))
+
+
+def make_dataset(rows, numeric=6, cardinalities=CARDINALITIES, null_fraction=0.01, seed=0):
+    """
+    Generate a synthetic dataset.
+
+    Parameters:
+    rows (int): Number of rows.
+    numeric (int): Number of numerical columns.
+    cardinalities (tuple): Number of distinct values of each categorical column.
+    null_fraction (float): Share of missing values in every column.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    pd.DataFrame: Columns num_0, num_1, ... followed by cat_0, cat_1, ...
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    base = rng.standard_normal(rows).astype('float32')
+    for i in range(numeric):
+        kind = i % 4
+        if kind == 0:
+            values = rng.normal(100, 15, rows).astype('float32')
+        elif kind == 1:
+            values = rng.lognormal(0, 1, rows).astype('float32')
+        elif kind == 2:
+            values = rng.integers(0, 1000, rows).astype('float32')
+        else:
+            # Correlated with the other 'correlated' columns through a shared factor
+            values = (base * (i + 1) + rng.standard_normal(rows)).astype('float32')
+        values[rng.random(rows) < null_fraction] = np.nan
+        columns[f"num_{i}"] = values
+
+    for i, cardinality in enumerate(cardinalities):
+        # Zipf-like frequencies, so a few categories dominate like in real data
+        weights = 1 / np.arange(1, cardinality + 1)
+        codes = rng.choice(cardinality, rows, p=weights / weights.sum()).astype('int32')
+        codes[rng.random(rows) < null_fraction] = -1
+        categories = [f"c{i}_{j}" for j in range(cardinality)]
+        columns[f"cat_{i}"] = pd.Categorical.from_codes(codes, categories)
+
+    return pd.DataFrame(columns)
+
+
+def dataset_path(rows, numeric=6, cardinalities=CARDINALITIES, data_dir=DATA_DIR):
+    # Parquet file of a generated dataset, generated on first use
+    name = f"synthetic_{rows}_{numeric}_{'-'.join(map(str, cardinalities))}.parquet"
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        make_dataset(rows, numeric, cardinalities).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--numeric', type=int, default=6)
+    parser.add_argument('--cardinality', default=','.join(map(str, CARDINALITIES)))
+    parser.add_argument('--out', help='Parquet or CSV file, stored in the benchmark data directory by default')
+    args = parser.parse_args()
+
+    cardinalities = tuple(int(value) for value in args.cardinality.split(','))
+    if args.out is None:
+        print(dataset_path(args.rows, args.numeric, cardinalities))
+        return
+    df = make_dataset(args.rows, args.numeric, cardinalities)
+    if args.out.endswith('.csv'):
+        df.to_csv(args.out, index=False)
+    else:
+        df.to_parquet(args.out, index=False)
+    print(args.out)
+
+
+if __name__ == '__main__':
+    main()
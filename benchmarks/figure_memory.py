@@ -0,0 +1,87 @@
+"""
+Check that rendering plots does not leak memory.
+
+Renders the page charts 1,000 times (from several threads at once, like
+concurrent Streamlit sessions) and reports the resident set size along the
+way. Exits with status 1 if RSS grew by more than --max-growth MB after the
+warm-up renders.
+
+Usage:
+python benchmarks/figure_memory.py [--renders 1000] [--threads 4] [--max-growth 32]
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+from aggregates import numeric_summaries  # noqa: E402
+from charts import boxplot, countplot, histogram, render_png  # noqa: E402
+from figures import render_figure  # noqa: E402
+
+
+def rss_mb():
+    # Current resident set size of this process
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--max-growth', type=float, default=32.0, help="Allowed RSS growth in MB")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'value': rng.normal(size=10_000),
+        'group': rng.choice(list('abcdef'), 10_000),
+    })
+    summary = numeric_summaries(df, ['value'])['value']
+    value_counts = df['group'].value_counts().reset_index()
+    correlation_matrix = pd.DataFrame(rng.uniform(-1, 1, (6, 6)))
+
+    def seaborn_boxplot(fig):
+        sns.boxplot(x='group', y='value', data=df, ax=fig.subplots())
+
+    def heatmap(fig):
+        sns.heatmap(correlation_matrix, annot=True, fmt='.2f', ax=fig.subplots())
+
+    renders = [
+        lambda: render_png(countplot, value_counts, 'group'),
+        lambda: render_png(histogram, summary['hist'], 'value'),
+        lambda: render_png(boxplot, summary['box'], 'value'),
+        lambda: render_figure(seaborn_boxplot),
+        lambda: render_figure(heatmap),
+    ]
+
+    def render(i):
+        return len(renders[i % len(renders)]())
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(render, range(args.warmup)))
+        baseline = rss_mb()
+        print(f"after {args.warmup} warm-up renders: {baseline:.1f} MB")
+        step = max(1, args.renders // 10)
+        for start in range(0, args.renders, step):
+            list(executor.map(render, range(start, min(start + step, args.renders))))
+            print(f"after {min(start + step, args.renders)} renders: {rss_mb():.1f} MB")
+
+    growth = rss_mb() - baseline
+    print(f"RSS growth: {growth:.1f} MB (allowed {args.max_growth:.1f} MB)")
+    return 0 if growth <= args.max_growth else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
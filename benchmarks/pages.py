@@ -0,0 +1,252 @@
+"""
+Benchmark the analysis functions of every page at several dataset sizes.
+
+Every case runs in a fresh Python process. A generated dataset (see
+datasets.py) is loaded into the session and one page function is driven
+headless through Streamlit's AppTest. The page script runs twice: the first
+run is cold, and the second run shows what the caches save.
+
+For every case and size the runner records:
+- seconds: the wall time of the cold call
+- warm_seconds: the wall time of the second call
+- peak_rss_mb: the peak resident set size of the process
+- output_bytes: the bytes sent to the browser, counting element messages and media files
+
+Results are written to benchmarks/results/pages-<timestamp>.csv. Pass
+--compare with an earlier results file to print the ratio of every timing.
+
+Set EDA_CHART_BACKEND=vega to benchmark the client-side charts. Pages are
+measured on their exact results: sample-first rendering is disabled in the
+child processes.
+
+Usage:
+python benchmarks/pages.py [--rows 10000,1000000,10000000] [--cases histogram,scatter] [--compare OLD.csv]
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+DEFAULT_ROWS = [10_000, 1_000_000, 10_000_000]
+
+FIELDS = ['case', 'rows', 'seconds', 'warm_seconds', 'peak_rss_mb', 'output_bytes']
+
+
+def load_page(filename):
+    # Page scripts start with a digit, so they are imported from their path
+    name = 'page_' + filename.split('_')[0]
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def numerical(profile, n=4):
+    return profile['numerical_columns'][:n]
+
+
+def categorical(profile, n=2):
+    return profile['categorical_columns'][:n]
+
+
+# Every case is a page file and a function driving it with the session already holding the dataset
+def case_value_counts(page, st, df, profile):
+    page.display_value_counts(df)
+
+
+def case_histogram(page, st, df, profile):
+    st.session_state['stored_columns'] = numerical(profile)
+    page.plot_histogram(df)
+
+
+def case_boxplot(page, st, df, profile):
+    st.session_state['stored_columns'] = numerical(profile)
+    page.plot_boxplot(df)
+
+
+def case_scatter(page, st, df, profile):
+    x_column, y_column = numerical(profile, 2)
+    page.plot_scatter_plot(df, x_column, y_column)
+
+
+def case_pairplot(page, st, df, profile):
+    from pairplot import MAX_PAIRPLOT_COLUMNS, build_pairplot
+    st.image(build_pairplot(df, profile['numerical_columns'][:MAX_PAIRPLOT_COLUMNS]))
+
+
+def case_box_plot(page, st, df, profile):
+    x_column, y_column = categorical(profile, 1)[0], numerical(profile, 1)[0]
+    page.show_plot(df, "Box Plot", x_column, y_column, page.CI_MODES[0], 12, 8)
+
+
+def case_bar_plot(page, st, df, profile):
+    x_column, y_column = categorical(profile, 1)[0], numerical(profile, 1)[0]
+    page.show_plot(df, "Bar Plot", x_column, y_column, page.CI_MODES[0], 12, 8)
+
+
+def case_stacked_bar(page, st, df, profile):
+    x_column, y_column = categorical(profile, 2)
+    page.plot_stacked_bar_chart(df, x_column, y_column)
+
+
+def case_associations(page, st, df, profile):
+    page.plot_all_associations(df, page.ASSOCIATION_MEASURES[0])
+
+
+def case_correlations(page, st, df, profile):
+    page.plot_all_correlations(df)
+
+
+CASES = {
+    'value_counts': ('02_Univariate_analysis_by_cat.py', case_value_counts),
+    'histogram': ('03_Univariate_analysis_by_num.py', case_histogram),
+    'boxplot': ('03_Univariate_analysis_by_num.py', case_boxplot),
+    'scatter': ('04_Bivariate_analysis_num-num.py', case_scatter),
+    'pairplot': ('04_Bivariate_analysis_num-num.py', case_pairplot),
+    'box_plot': ('05_Bivariate_analysis_num-cat.py', case_box_plot),
+    'bar_plot': ('05_Bivariate_analysis_num-cat.py', case_bar_plot),
+    'stacked_bar': ('06_Bivariate_analysis_cat-cat.py', case_stacked_bar),
+    'associations': ('06_Bivariate_analysis_cat-cat.py', case_associations),
+    'correlations': ('07_Bivariate_analysis_corr-matrix.py', case_correlations),
+}
+
+# Script run by AppTest in the child process, measuring one call of the case per run
+DRIVER = """
+import os, sys, time
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+import streamlit as st
+from streamlit.runtime import Runtime
+from dataset_cache import session_dataset, session_profile, set_session_dataset
+
+
+def run():
+    spec_name = 'benchmark_pages'
+    if spec_name not in sys.modules:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(spec_name, {runner!r})
+        sys.modules[spec_name] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[spec_name])
+    bench = sys.modules[spec_name]
+
+    df = session_dataset()
+    if df is None:
+        import pandas as pd
+        df = set_session_dataset({key!r}, pd.read_parquet({path!r}))
+    profile = session_profile(df)
+    filename, case = bench.CASES[{case!r}]
+    page = bench.load_page(filename)
+
+    start = time.perf_counter()
+    case(page, st, df, profile)
+    seconds = time.perf_counter() - start
+
+    media_stats = Runtime.instance().media_file_mgr._storage.get_stats()
+    media_bytes = sum(stat.byte_length for stats in media_stats.values() for stat in stats)
+    st.session_state.setdefault('benchmark', []).append({{'seconds': seconds, 'media_bytes': media_bytes}})
+
+
+# Render workers are spawned and re-import this script as __mp_main__
+if __name__ == '__main__':
+    run()
+"""
+
+
+def element_bytes(node):
+    # Serialized size of the element messages of a rendered AppTest tree
+    proto = getattr(node, 'proto', None)
+    size = proto.ByteSize() if proto is not None and hasattr(proto, 'ByteSize') else 0
+    return size + sum(element_bytes(child) for child in getattr(node, 'children', {}).values())
+
+
+def run_child(case, rows):
+    # Runs in the child process: measure one case at one size and print the result as JSON
+    sys.path.insert(0, ROOT)
+    from datasets import dataset_path
+    from streamlit.testing.v1 import AppTest
+
+    path = dataset_path(rows)
+    key = os.path.splitext(os.path.basename(path))[0]
+    driver = DRIVER.format(root=ROOT, runner=os.path.abspath(__file__), key=key, path=path, case=case)
+    app = AppTest.from_string(driver, default_timeout=3600)
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    output_bytes = element_bytes(app._tree)
+    app.run()
+    cold, warm = app.session_state['benchmark']
+    print(json.dumps({
+        'case': case,
+        'rows': rows,
+        'seconds': round(cold['seconds'], 4),
+        'warm_seconds': round(warm['seconds'], 4),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'output_bytes': output_bytes + cold['media_bytes'],
+    }))
+
+
+def measure(case, rows):
+    # Run a case in a fresh interpreter, so caches and peak RSS start from zero
+    env = dict(os.environ, EDA_WARMUP='0', EDA_TRACE='0', EDA_SAMPLE_THRESHOLD='0')
+    command = [sys.executable, os.path.abspath(__file__), '--child', case, str(rows)]
+    output = subprocess.run(command, capture_output=True, text=True, env=env)
+    if output.returncode != 0:
+        raise RuntimeError(f"{case} at {rows} rows failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def read_results(path):
+    with open(path, newline='') as f:
+        return {(row['case'], int(row['rows'])): row for row in csv.DictReader(f)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default=','.join(map(str, DEFAULT_ROWS)))
+    parser.add_argument('--cases', default=','.join(CASES))
+    parser.add_argument('--out', help='results file, benchmarks/results/pages-<timestamp>.csv by default')
+    parser.add_argument('--compare', help='earlier results file to compare the timings with')
+    parser.add_argument('--child', nargs=2, metavar=('CASE', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], int(args.child[1]))
+        return
+
+    out = args.out or os.path.join(RESULTS_DIR, f"pages-{time.strftime('%Y%m%d-%H%M%S')}.csv")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    previous = read_results(args.compare) if args.compare else {}
+
+    with open(out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for rows in [int(value) for value in args.rows.split(',')]:
+            for case in args.cases.split(','):
+                result = measure(case, rows)
+                writer.writerow(result)
+                f.flush()
+                line = (
+                    f"{case:<14} {rows:>11,} rows  {result['seconds']:8.3f} s  warm {result['warm_seconds']:8.3f} s  "
+                    f"peak {result['peak_rss_mb']:8.1f} MB  output {result['output_bytes'] / 1024:9.1f} KB"
+                )
+                old = previous.get((case, rows))
+                if old is not None and float(old['seconds']) > 0:
+                    line += f"  x{result['seconds'] / float(old['seconds']):.2f} vs previous"
+                print(line, flush=True)
+    print(f"Results written to {out}")
+
+
+if __name__ == '__main__':
+    main()
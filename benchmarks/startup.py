@@ -0,0 +1,71 @@
+"""
+Measure the cold start time of every page.
+
+Each page runs once in a fresh Python process (so nothing is imported yet),
+through Streamlit's AppTest harness and without an uploaded dataset. The
+script reports the wall time of the first run and which heavy libraries the
+page imported, and exits with status 1 if a page is over its budget.
+
+Usage:
+python benchmarks/startup.py [--budget-scale 1.0]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds allowed for the first run of each page, on a cold process
+PAGE_BUDGETS = {
+    'Menu.py': 1.5,
+    '02_Univariate_analysis_by_cat.py': 2.0,
+    '03_Univariate_analysis_by_num.py': 2.0,
+    '04_Bivariate_analysis_num-num.py': 2.0,
+    '05_Bivariate_analysis_num-cat.py': 2.0,
+    '06_Bivariate_analysis_cat-cat.py': 2.0,
+    '07_Bivariate_analysis_corr-matrix.py': 2.0,
+}
+
+HEAVY_MODULES = ['pandas', 'pyarrow', 'matplotlib.pyplot', 'seaborn', 'scipy']
+
+# Runs in the child process and prints its measurements as JSON
+CHILD = """
+import json, os, sys, time
+os.environ['EDA_WARMUP'] = '0'
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({page!r}, default_timeout=60).run()
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'imported': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(page):
+    # Run a single page in a fresh interpreter
+    code = CHILD.format(root=ROOT, page=page, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='multiply every budget, for slower machines')
+    args = parser.parse_args()
+
+    failed = False
+    for page, budget in PAGE_BUDGETS.items():
+        result = measure(page)
+        budget *= args.budget_scale
+        status = 'ok' if result['seconds'] <= budget else 'OVER BUDGET'
+        failed = failed or result['seconds'] > budget
+        imported = ', '.join(result['imported']) or '-'
+        print(f"{page:<40} {result['seconds']:6.2f} s / {budget:4.1f} s  {status:<12} imported: {imported}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+from figures import close_figure, figure_to_png, new_figure
+from perf import span
+
+
+def render_png(renderer, *args):
+    """
+    Draw a chart and encode it as PNG.
+
+    This is the unit of work sent to the rendering processes, so renderers
+    must be module-level functions of this module and their arguments small
+    summaries rather than DataFrames.
+
+    Parameters:
+    renderer (callable): One of the chart functions of this module.
+    args: The arguments of the renderer.
+
+    Returns:
+    bytes: The PNG image.
+    """
+    with span('render', renderer.__name__):
+        fig = renderer(*args)
+    try:
+        return figure_to_png(fig)
+    finally:
+        close_figure(fig)
+
+
+def countplot(value_counts, column):
+    """
+    Draw a count plot from precomputed value counts.
+
+    Parameters:
+    value_counts (pd.DataFrame): The values in the first column and their counts in the second.
+    column (str): The name of the categorical column.
+
+    Returns:
+    Figure: The chart.
+    """
+    fig = new_figure()
+    ax = fig.subplots()
+    labels = [str(value) for value in value_counts.iloc[:, 0]]
+    ax.bar(range(len(labels)), value_counts.iloc[:, 1].to_numpy())
+    ax.set_xticks(range(len(labels)), labels, rotation=45)
+    ax.set_xlabel(column)
+    ax.set_ylabel('Count')
+    return fig
+
+
+def histogram(hist, column):
+    """
+    Draw a histogram from precomputed bin counts.
+
+    Parameters:
+    hist (tuple): The counts and bin edges from aggregates.histogram_summary.
+    column (str): The name of the numerical column.
+
+    Returns:
+    Figure: The chart.
+    """
+    counts, edges = hist
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.stairs(counts, edges, fill=True, alpha=0.7)
+    ax.stairs(counts, edges)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_xlabel(column)
+    ax.set_ylabel('Count')
+    return fig
+
+
+def boxplot(box, column):
+    """
+    Draw a horizontal boxplot from precomputed quartiles, whiskers and outliers.
+
+    Parameters:
+    box (dict): The statistics from aggregates.box_summary.
+    column (str): The name of the numerical column.
+
+    Returns:
+    Figure: The chart.
+    """
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.bxp([box], orientation='horizontal', showfliers=True, patch_artist=True)
+    ax.set_yticks([])
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_xlabel(column)
+    ax.set_ylabel('Value')
+    return fig
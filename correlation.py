@@ -0,0 +1,548 @@
+import importlib.util
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregates import category_codes, check_cancelled
+
+# Parquet files are only read through pyarrow, imported on first use
+HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# Hierarchical clustering of wide matrices uses scipy when it is installed
+HAVE_SCIPY = importlib.util.find_spec('scipy') is not None
+
+# Rows per chunk fed to the accumulator
+CORRELATION_CHUNK_SIZE = 250_000
+
+# Threads computing chunk statistics, the matrix products release the GIL
+CORRELATION_WORKERS = int(os.environ.get('EDA_CORRELATION_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Number of correlation matrices kept in memory
+MATRIX_CACHE_SIZE = 32
+
+# Above this many columns page 07 switches to the wide-table mode
+WIDE_CORRELATION_COLUMNS = 50
+
+# Size of the float32 row blocks standardized at once by the wide-table mode
+WIDE_BLOCK_BYTES = 64 * 1024 ** 2
+
+# Largest side of a heatmap drawn from a wide matrix, larger matrices are block averaged
+HEATMAP_MAX_SIZE = 400
+
+# Categories kept per column by the association matrices, the rarest ones share a single code
+ASSOCIATION_MAX_CATEGORIES = 1000
+
+_matrix_cache = OrderedDict()
+_matrix_cache_lock = threading.Lock()
+
+
+class CorrelationAccumulator:
+    """
+    Mergeable pairwise-complete Pearson correlation.
+
+    For every pair of columns (i, j) it keeps, over the rows where both are
+    present, the row count, the mean and sum of squared deviations of column i
+    and the co-moment of i and j. Chunks are summarized independently and
+    merged with Chan's parallel update, so the result matches DataFrame.corr()
+    without ever holding all rows in memory.
+    """
+
+    def __init__(self, columns):
+        k = len(columns)
+        self.columns = list(columns)
+        self.n = np.zeros((k, k))
+        self.mean = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.comoment = np.zeros((k, k))
+
+    @classmethod
+    def from_chunk(cls, columns, values):
+        """
+        Summarize one chunk of rows.
+
+        Parameters:
+        columns (list): The column names.
+        values (np.ndarray): The (rows, columns) float array of the chunk, NaN for missing values.
+
+        Returns:
+        CorrelationAccumulator: The statistics of the chunk.
+        """
+        acc = cls(columns)
+        valid = np.isfinite(values)
+        present = valid.astype('float64')
+
+        # Shift by the chunk means first to avoid cancellation in the sums of squares
+        shift = np.nan_to_num(np.nanmean(np.where(valid, values, np.nan), axis=0)) if len(values) else 0
+        centered = np.where(valid, values - shift, 0.0)
+
+        n = present.T @ present
+        sums = centered.T @ present
+        squares = (centered ** 2).T @ present
+        products = centered.T @ centered
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, sums / n, 0.0)
+        acc.n = n
+        acc.mean = mean + np.reshape(shift, (-1, 1))
+        acc.m2 = squares - n * mean ** 2
+        acc.comoment = products - n * mean * mean.T
+        return acc
+
+    def merge(self, other):
+        """
+        Combine the statistics of two disjoint sets of rows.
+
+        Parameters:
+        other (CorrelationAccumulator): Statistics of other rows of the same columns.
+
+        Returns:
+        CorrelationAccumulator: This accumulator, updated in place.
+        """
+        n = self.n + other.n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(n > 0, self.n * other.n / n, 0.0)
+            fraction = np.where(n > 0, other.n / n, 0.0)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * fraction
+        self.m2 = self.m2 + other.m2 + delta ** 2 * weight
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.n = n
+        return self
+
+    def correlation(self):
+        # Pearson correlation matrix, NaN where a pair has too few rows or no variance
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matrix = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        matrix[self.n < 2] = np.nan
+        matrix = np.clip(matrix, -1.0, 1.0)
+        return pd.DataFrame(matrix, index=self.columns, columns=self.columns)
+
+
+def _summarize(columns, chunks, cancelled=None):
+    # Summarize the chunks on a thread pool and fold the partial results together,
+    # keeping only a few chunks in flight so the rows are never all in memory
+    total = CorrelationAccumulator(columns)
+    if CORRELATION_WORKERS > 1:
+        with ThreadPoolExecutor(max_workers=CORRELATION_WORKERS) as executor:
+            pending = deque()
+            for values in chunks:
+                check_cancelled(cancelled)
+                pending.append(executor.submit(CorrelationAccumulator.from_chunk, columns, values))
+                if len(pending) >= 2 * CORRELATION_WORKERS:
+                    total.merge(pending.popleft().result())
+            while pending:
+                total.merge(pending.popleft().result())
+    else:
+        for values in chunks:
+            check_cancelled(cancelled)
+            total.merge(CorrelationAccumulator.from_chunk(columns, values))
+    return total
+
+
+def correlation_from_frame(df, columns, chunksize=CORRELATION_CHUNK_SIZE, cancelled=None):
+    """
+    Compute the correlation matrix of in-memory columns chunk by chunk.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    columns (list): The numerical columns.
+    chunksize (int): Rows per chunk.
+    cancelled (threading.Event): Optional event stopping the computation between two chunks.
+
+    Returns:
+    pd.DataFrame: The correlation matrix.
+    """
+    chunks = (
+        df[columns].iloc[start:start + chunksize].to_numpy(dtype='float64', na_value=np.nan)
+        for start in range(0, len(df), chunksize)
+    )
+    return _summarize(columns, chunks, cancelled).correlation()
+
+
+def correlation_from_parquet(path, columns, chunksize=CORRELATION_CHUNK_SIZE, cancelled=None):
+    """
+    Compute the correlation matrix straight from a Parquet file, one record batch at a time.
+
+    Parameters:
+    path (str): The Parquet file.
+    columns (list): The numerical columns.
+    chunksize (int): Rows per record batch.
+    cancelled (threading.Event): Optional event stopping the computation between two batches.
+
+    Returns:
+    pd.DataFrame: The correlation matrix.
+    """
+    import pyarrow.parquet as pq
+
+    batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=list(columns))
+    chunks = (
+        batch.to_pandas()[list(columns)].to_numpy(dtype='float64', na_value=np.nan)
+        for batch in batches
+    )
+    return _summarize(columns, chunks, cancelled).correlation()
+
+
+def _cached_matrix(key, compute):
+    # Shared LRU lookup of the matrix cache, a key without fingerprint is never cached
+    if key[0] is not None:
+        with _matrix_cache_lock:
+            if key in _matrix_cache:
+                _matrix_cache.move_to_end(key)
+                return _matrix_cache[key]
+    value = compute()
+    if key[0] is not None:
+        with _matrix_cache_lock:
+            _matrix_cache[key] = value
+            while len(_matrix_cache) > MATRIX_CACHE_SIZE:
+                _matrix_cache.popitem(last=False)
+    return value
+
+
+def dataset_correlation(df, dataset_fp, columns, path=None, cancelled=None):
+    """
+    Return the correlation matrix of a dataset, computing it at most once per column set.
+
+    Parameters:
+    df (pd.DataFrame): The dataset, used when no Parquet file is available.
+    dataset_fp (str): The dataset fingerprint, None disables caching.
+    columns (list): The numerical columns.
+    path (str): Optional Parquet file holding the dataset.
+    cancelled (threading.Event): Optional event stopping the computation between two chunks.
+
+    Returns:
+    pd.DataFrame: The correlation matrix.
+    """
+    def compute():
+        if path is not None and HAVE_PYARROW and os.path.exists(path):
+            return correlation_from_parquet(path, columns, cancelled=cancelled)
+        return correlation_from_frame(df, columns, cancelled=cancelled)
+
+    return _cached_matrix((dataset_fp, tuple(columns)), compute)
+
+
+def wide_correlation_from_chunks(columns, chunks, means, stds, pairwise=True, cancelled=None):
+    """
+    Compute a correlation matrix block by block in float32, for tables with many columns.
+
+    Every block of rows is standardized with the column means and standard
+    deviations, then float32 matrix products give its contribution,
+    accumulated in float64. When pairwise is set, missing values count as
+    zero and the products also give, for every pair, the row count, sums and
+    sums of squares over the rows where both columns are present. Every pair
+    is then centered on its own means, which gives the pairwise-complete
+    correlation of DataFrame.corr(). Standardizing first only shifts and
+    scales the columns, which the correlation ignores, and keeps the float32
+    products accurate.
+
+    Parameters:
+    columns (list): The column names.
+    chunks (iterable): (rows, columns) float32 arrays, NaN for missing values.
+    means (np.ndarray): The mean of every column.
+    stds (np.ndarray): The standard deviation of every column.
+    pairwise (bool): Whether the columns have missing values.
+    cancelled (threading.Event): Optional event stopping the computation between two blocks.
+
+    Returns:
+    pd.DataFrame: The float32 correlation matrix.
+    """
+    k = len(columns)
+    means = np.asarray(means, dtype='float32')
+    # Constant columns get a unit scale, their correlations end up NaN
+    stds = np.where(np.asarray(stds, dtype='float64') > 0, stds, 1).astype('float32')
+    products = np.zeros((k, k))
+    if pairwise:
+        # counts[i, j] rows with both columns, sums[i, j] and squares[i, j]
+        # the sum of column i and of its squares over those rows
+        counts = np.zeros((k, k))
+        sums = np.zeros((k, k))
+        squares = np.zeros((k, k))
+    for values in chunks:
+        check_cancelled(cancelled)
+        z = (values - means) / stds
+        if pairwise:
+            present = np.isfinite(z)
+            z[~present] = 0
+            present = present.astype('float32')
+            counts += present.T @ present
+            sums += z.T @ present
+            squares += (z * z).T @ present
+        products += z.T @ z
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if pairwise:
+            covariance = products - sums * sums.T / counts
+            variance = squares - sums * sums / counts
+            matrix = covariance / np.sqrt(variance * variance.T)
+        else:
+            diagonal = np.diag(products)
+            matrix = products / np.sqrt(np.outer(diagonal, diagonal))
+    matrix = np.clip(matrix, -1.0, 1.0).astype('float32')
+    return pd.DataFrame(matrix, index=columns, columns=columns)
+
+
+def wide_correlation(df, dataset_fp, columns, stats=None, pairwise=True, path=None, cancelled=None):
+    """
+    Return the wide-table correlation matrix of a dataset, computing it at most once per column set.
+
+    Parameters:
+    df (pd.DataFrame): The dataset, used when no Parquet file is available.
+    dataset_fp (str): The dataset fingerprint, None disables caching.
+    columns (list): The numerical columns.
+    stats (pd.DataFrame): Optional 'mean' and 'std' per column, as in the dataset profile.
+    pairwise (bool): Whether the columns have missing values.
+    path (str): Optional Parquet file holding the dataset.
+    cancelled (threading.Event): Optional event stopping the computation between two blocks.
+
+    Returns:
+    pd.DataFrame: The float32 correlation matrix.
+    """
+    columns = list(columns)
+    rows_per_block = max(1, WIDE_BLOCK_BYTES // (4 * max(1, len(columns))))
+
+    def compute():
+        if stats is not None:
+            means = stats.loc[columns, 'mean'].to_numpy()
+            stds = stats.loc[columns, 'std'].to_numpy()
+        else:
+            means = df[columns].mean().to_numpy()
+            stds = df[columns].std().to_numpy()
+        if path is not None and HAVE_PYARROW and os.path.exists(path):
+            import pyarrow.parquet as pq
+
+            batches = pq.ParquetFile(path).iter_batches(batch_size=rows_per_block, columns=columns)
+            chunks = (
+                batch.to_pandas()[columns].to_numpy(dtype='float32', na_value=np.nan)
+                for batch in batches
+            )
+        else:
+            chunks = (
+                df[columns].iloc[start:start + rows_per_block].to_numpy(dtype='float32', na_value=np.nan)
+                for start in range(0, len(df), rows_per_block)
+            )
+        return wide_correlation_from_chunks(columns, chunks, means, stds, pairwise, cancelled)
+
+    return _cached_matrix((dataset_fp, 'wide', tuple(columns)), compute)
+
+
+def top_pairs(matrix, k=50):
+    """
+    Rank the most strongly correlated pairs of distinct columns.
+
+    Parameters:
+    matrix (pd.DataFrame): A correlation matrix.
+    k (int): Number of pairs returned.
+
+    Returns:
+    pd.DataFrame: 'column_1', 'column_2' and 'correlation', strongest absolute correlation first.
+    """
+    strength = np.abs(np.nan_to_num(matrix.to_numpy(), nan=0.0))
+    # Each pair once, from the upper triangle
+    strength[np.tril_indices(len(strength))] = -1
+    k = min(k, len(strength) * (len(strength) - 1) // 2)
+    if k <= 0:
+        return pd.DataFrame(columns=['column_1', 'column_2', 'correlation'])
+    flat = np.argpartition(strength.ravel(), -k)[-k:]
+    flat = flat[np.argsort(strength.ravel()[flat])[::-1]]
+    rows, columns = np.unravel_index(flat, strength.shape)
+    return pd.DataFrame({
+        'column_1': matrix.index[rows],
+        'column_2': matrix.columns[columns],
+        'correlation': matrix.to_numpy()[rows, columns],
+    })
+
+
+def cluster_order(matrix):
+    """
+    Order the columns of a correlation matrix so that correlated columns are adjacent.
+
+    Uses average-linkage hierarchical clustering on 1 - |r| when scipy is
+    installed, and otherwise a greedy nearest-neighbour chain, which is also
+    quadratic in the number of columns.
+
+    Parameters:
+    matrix (pd.DataFrame): A correlation matrix.
+
+    Returns:
+    list: The column positions in display order.
+    """
+    similarity = np.abs(np.nan_to_num(matrix.to_numpy(dtype='float64'), nan=0.0))
+    k = len(similarity)
+    if k <= 2:
+        return list(range(k))
+    if HAVE_SCIPY:
+        from scipy.cluster.hierarchy import leaves_list, linkage
+        from scipy.spatial.distance import squareform
+
+        distance = 1 - similarity
+        np.fill_diagonal(distance, 0)
+        return leaves_list(linkage(squareform(distance, checks=False), method='average')).tolist()
+
+    np.fill_diagonal(similarity, -np.inf)
+    visited = np.zeros(k, dtype=bool)
+    # Start from the column most correlated with the others and always step to its closest unvisited neighbour
+    order = [int(np.argmax(np.where(np.isfinite(similarity), similarity, 0).sum(axis=1)))]
+    visited[order[0]] = True
+    for _ in range(k - 1):
+        candidates = np.where(visited, -np.inf, similarity[order[-1]])
+        following = int(np.argmax(candidates))
+        if visited[following]:
+            following = int(np.flatnonzero(~visited)[0])
+        order.append(following)
+        visited[following] = True
+    return order
+
+
+def downsample_matrix(matrix, max_size=HEATMAP_MAX_SIZE):
+    """
+    Average a square matrix over blocks so that it has at most max_size rows and columns.
+
+    Parameters:
+    matrix (pd.DataFrame): The matrix, already in display order.
+    max_size (int): Largest number of rows and columns kept.
+
+    Returns:
+    pd.DataFrame: The block averages, labelled by the first column of each block.
+    """
+    k = len(matrix)
+    if k <= max_size:
+        return matrix
+    starts = np.linspace(0, k, max_size + 1).astype('int64')[:-1]
+    values = matrix.to_numpy(dtype='float64')
+    valid = np.isfinite(values)
+    sums = np.add.reduceat(np.add.reduceat(np.where(valid, values, 0), starts, axis=0), starts, axis=1)
+    counts = np.add.reduceat(np.add.reduceat(valid.astype('float64'), starts, axis=0), starts, axis=1)
+    with np.errstate(invalid='ignore'):
+        blocks = (sums / counts).astype('float32')
+    labels = [str(label) for label in matrix.index[starts]]
+    return pd.DataFrame(blocks, index=labels, columns=labels)
+
+
+def cramers_v(table):
+    """
+    Compute Cramér's V of a contingency table.
+
+    Parameters:
+    table (np.ndarray): The counts of every pair of categories.
+
+    Returns:
+    float: The association between the two columns, from 0 to 1, NaN if either has a single category.
+    """
+    table = np.asarray(table, dtype='float64')
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    n = table.sum()
+    k = min(table.shape) - 1
+    if n == 0 or k == 0:
+        return np.nan
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+    chi2 = ((table - expected) ** 2 / expected).sum()
+    return float(min(1.0, np.sqrt(chi2 / n / k)))
+
+
+def theils_u(table):
+    """
+    Compute Theil's uncertainty coefficient of a contingency table in both directions.
+
+    Parameters:
+    table (np.ndarray): The counts of every pair of categories.
+
+    Returns:
+    tuple: U(rows | columns) and U(columns | rows), the share of the entropy of one
+    column explained by the other, 1 for a column with a single category.
+    """
+    table = np.asarray(table, dtype='float64')
+    n = table.sum()
+    if n == 0:
+        return np.nan, np.nan
+
+    def entropy(p):
+        p = p[p > 0]
+        return float(-(p * np.log(p)).sum())
+
+    p = table / n
+    h_rows = entropy(p.sum(axis=1))
+    h_columns = entropy(p.sum(axis=0))
+    h_joint = entropy(p.ravel())
+    # H(rows | columns) = H(rows, columns) - H(columns), and the other way around
+    u_rows = (h_rows - h_joint + h_columns) / h_rows if h_rows > 0 else 1.0
+    u_columns = (h_columns - h_joint + h_rows) / h_columns if h_columns > 0 else 1.0
+    return min(1.0, max(0.0, u_rows)), min(1.0, max(0.0, u_columns))
+
+
+def _association_codes(series, max_categories):
+    # Codes of the observed categories, most frequent first, the rarest merged into the last code
+    codes, categories = category_codes(series)
+    codes = np.asarray(codes, dtype='int64')
+    counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+    # One extra slot, so that missing values (-1) stay -1
+    remap = np.full(len(categories) + 1, -1, dtype='int32')
+    remap[order] = np.minimum(np.arange(len(order)), max_categories - 1)
+    return remap[codes], min(len(order), max_categories)
+
+
+def association_matrices(df, columns, max_categories=ASSOCIATION_MAX_CATEGORIES, cancelled=None):
+    """
+    Compute Cramér's V and Theil's U for every pair of categorical columns.
+
+    Every column is encoded once as integer codes. The contingency table of
+    a pair is a single bincount over the combined codes of its rows where
+    both values are present, and the pairs are counted in parallel.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    columns (list): The categorical columns.
+    max_categories (int): Categories kept per column, the rarest ones are counted together.
+    cancelled (threading.Event): Optional event stopping the computation between two pairs.
+
+    Returns:
+    dict: "Cramér's V" and "Theil's U" matrices. Theil's U is asymmetric: the cell
+    of row a and column b is U(a | b), how much knowing b tells about a.
+    """
+    columns = list(columns)
+    k = len(columns)
+    with ThreadPoolExecutor(max_workers=CORRELATION_WORKERS) as executor:
+        encoded = list(executor.map(lambda column: _association_codes(df[column], max_categories), columns))
+
+        def associate(pair):
+            check_cancelled(cancelled)
+            (x, nx), (y, ny) = encoded[pair[0]], encoded[pair[1]]
+            valid = (x >= 0) & (y >= 0)
+            combined = x[valid].astype('int64') * ny + y[valid]
+            table = np.bincount(combined, minlength=nx * ny).reshape(nx, ny)
+            return cramers_v(table), theils_u(table)
+
+        pairs = [(i, j) for i in range(k) for j in range(i + 1, k)]
+        results = list(executor.map(associate, pairs))
+
+    v = np.eye(k)
+    u = np.eye(k)
+    for (i, j), (association, (u_ij, u_ji)) in zip(pairs, results):
+        v[i, j] = v[j, i] = association
+        u[i, j], u[j, i] = u_ij, u_ji
+    return {
+        "Cramér's V": pd.DataFrame(v, index=columns, columns=columns),
+        "Theil's U": pd.DataFrame(u, index=columns, columns=columns),
+    }
+
+
+def dataset_associations(df, dataset_fp, columns, cancelled=None):
+    """
+    Return the association matrices of a dataset, computing them at most once per column set.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    dataset_fp (str): The dataset fingerprint, None disables caching.
+    columns (list): The categorical columns.
+    cancelled (threading.Event): Optional event stopping the computation between two pairs.
+
+    Returns:
+    dict: The matrices by measure, as returned by association_matrices.
+    """
+    return _cached_matrix(
+        (dataset_fp, 'association', tuple(columns)), lambda: association_matrices(df, columns, cancelled=cancelled)
+    )
@@ -0,0 +1,426 @@
+import hashlib
+import importlib.util
+import os
+import pickle
+import uuid
+
+import streamlit as st
+
+from dataset_registry import get_registry
+from perf import span
+
+# pandas, pyarrow and the parsing helpers are imported on first use, so pages
+# start without them while nothing has been uploaded. DataFrame.to_parquet
+# needs pyarrow, without it the cache is disabled.
+HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# Directory holding the converted datasets, one Parquet file per fingerprint
+CACHE_DIR = os.environ.get(
+    'EDA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'stremlitweb')
+)
+
+# Total size of the cache directory before the least recently used datasets are evicted
+CACHE_MAX_BYTES = int(os.environ.get('EDA_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Server directory whose files can be opened in place instead of uploaded, disabled when unset
+DATA_DIR = os.environ.get('EDA_DATA_DIR')
+
+# Extensions of the dataset files kept in the cache directory
+_CACHE_EXTENSIONS = ('.parquet', '.arrow')
+
+_BLOCK_SIZE = 1024 * 1024
+
+
+def fingerprint(file, *options):
+    """
+    Hash the content of a file together with the options used to parse it.
+
+    Parameters:
+    file: A file-like object such as a Streamlit UploadedFile.
+    options: Parse options (separator, sheet name, ...) that change the resulting DataFrame.
+
+    Returns:
+    str: A hex digest identifying the dataset.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(_BLOCK_SIZE), b''):
+        digest.update(block)
+    file.seek(0)
+    digest.update(repr(options).encode())
+    return digest.hexdigest()
+
+
+def local_fingerprint(path, *options):
+    """
+    Identify a file of the server by its path, size and modification time.
+
+    Hashing the content of a file of several gigabytes would take longer
+    than opening it, and a file changed in place gets a new fingerprint.
+
+    Parameters:
+    path (str): The file path.
+    options: Parse options that change the resulting DataFrame.
+
+    Returns:
+    str: A hex digest identifying the dataset.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    digest.update(repr((os.path.realpath(path), stat.st_size, stat.st_mtime_ns, options)).encode())
+    return digest.hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.parquet")
+
+
+def arrow_path(key):
+    # CSV files of the data directory are converted once into an Arrow IPC file that is memory-mapped
+    return os.path.join(CACHE_DIR, f"{key}.arrow")
+
+
+def profile_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.profile.pkl")
+
+
+def load(key):
+    """
+    Load a dataset from the cache.
+
+    Parameters:
+    key (str): The dataset fingerprint.
+
+    Returns:
+    pd.DataFrame: The cached DataFrame, or None if it is not cached.
+    """
+    path = cache_path(key)
+    if HAVE_PYARROW and os.path.exists(arrow_path(key)):
+        from ingest import read_arrow_mmap
+
+        os.utime(arrow_path(key))
+        with span('ingest', 'arrow mmap'):
+            return read_arrow_mmap(arrow_path(key))
+    if not HAVE_PYARROW or not os.path.exists(path):
+        return None
+    import pandas as pd
+
+    # The modification time doubles as the last access time for LRU eviction
+    os.utime(path)
+    with span('ingest', 'parquet load'):
+        return pd.read_parquet(path)
+
+
+def store(key, df):
+    """
+    Write a dataset to the cache and evict old entries beyond the size budget.
+
+    Parameters:
+    key (str): The dataset fingerprint.
+    df (pd.DataFrame): The DataFrame to store.
+
+    Returns:
+    None
+    """
+    if not HAVE_PYARROW:
+        return
+    import pyarrow as pa
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(key)
+    # Write to a temporary file first so concurrent sessions never read a partial file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with span('ingest', 'parquet store'):
+            df.to_parquet(tmp_path, index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # A column Arrow cannot convert, e.g. mixed Python objects, only
+        # costs the cache: the dataset is used from memory
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    os.replace(tmp_path, path)
+    evict(keep=key)
+
+
+def load_profile(key):
+    """
+    Load the profile stored next to a cached dataset.
+
+    Parameters:
+    key (str): The dataset fingerprint.
+
+    Returns:
+    dict: The profile built by dataset_profile.build_profile, or None if it is not cached.
+    """
+    try:
+        with open(profile_path(key), 'rb') as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def store_profile(key, profile):
+    if not HAVE_PYARROW or not any(os.path.exists(path) for path in [cache_path(key), arrow_path(key)]):
+        return
+    tmp_path = f"{profile_path(key)}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(profile, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, profile_path(key))
+
+
+def evict(max_bytes=None, keep=None):
+    """
+    Delete the least recently used datasets until the cache fits in its size budget.
+
+    Parameters:
+    max_bytes (int): The size budget, CACHE_MAX_BYTES by default.
+    keep (str): A fingerprint that must not be evicted.
+
+    Returns:
+    None
+    """
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        key, extension = os.path.splitext(name)
+        if extension not in _CACHE_EXTENSIONS:
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, key, path))
+
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, key, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        for evicted_path in [path, profile_path(key)]:
+            try:
+                os.remove(evicted_path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def load_or_parse(file, reader, *options):
+    """
+    Return the dataset for an uploaded file, parsing it only if it is not cached yet.
+
+    Parameters:
+    file: A file-like object such as a Streamlit UploadedFile.
+    reader (callable): Function parsing the file into a DataFrame on a cache miss.
+    options: Parse options that are part of the fingerprint.
+
+    Returns:
+    tuple: The fingerprint and the DataFrame.
+    """
+    with span('ingest', 'fingerprint'):
+        key = fingerprint(file, *options)
+    # Another session may already hold this dataset in memory
+    df = get_registry().get(key)
+    if df is None:
+        df = load(key)
+    if df is None:
+        with span('ingest', 'parse'):
+            df = reader(file)
+        store(key, df)
+    return key, df
+
+
+def load_into_session(file, reader=None, *options):
+    """
+    Load an uploaded file through the cache and make it the current dataset of the session.
+
+    Every widget interaction reruns the page with the same upload. The
+    fingerprint of the upload is kept in the session by file_id, so these
+    reruns return the session dataset without hashing the file again.
+
+    Parameters:
+    file: A file-like object such as a Streamlit UploadedFile.
+    reader (callable): Function parsing the file on a cache miss, a compact
+    comma separated CSV read by default.
+    options: Parse options that are part of the fingerprint.
+
+    Returns:
+    pd.DataFrame: The loaded DataFrame.
+    """
+    if reader is None:
+        from ingest import read_csv_chunked
+        reader = lambda file: read_csv_chunked(file)[0]
+        options = (',',)
+    upload = (getattr(file, 'file_id', None), options)
+    loaded = st.session_state.get('dataset_upload')
+    if upload[0] is not None and loaded is not None and loaded[0] == upload:
+        if st.session_state.get('dataset_fp') == loaded[1]:
+            df = session_dataset()
+            if df is not None:
+                return df
+    key, df = load_or_parse(file, reader, *options)
+    df = set_session_dataset(key, df)
+    st.session_state['dataset_upload'] = (upload, key)
+    return df
+
+
+def open_local(path, sep=',', progress=None):
+    """
+    Open a file of the server data directory without reading it through the browser.
+
+    Arrow IPC and Feather files are memory-mapped where they are. CSV files
+    are converted block by block into an Arrow IPC file of the cache
+    directory on first use, then memory-mapped as well, so a file larger
+    than RAM can be explored. Parquet files are read with pandas.
+
+    Parameters:
+    path (str): The file, inside DATA_DIR.
+    sep (str): The column separator of a CSV file.
+    progress (callable): Optional callback receiving the fraction of a CSV file converted so far.
+
+    Returns:
+    tuple: The fingerprint and the DataFrame.
+    """
+    from ingest import LOCAL_FORMATS, csv_to_arrow, read_arrow_mmap
+
+    kind = LOCAL_FORMATS[os.path.splitext(path)[1].lower()]
+    options = (sep,) if kind == 'csv' else ()
+    key = local_fingerprint(path, *options)
+    df = get_registry().get(key)
+    if df is not None:
+        return key, df
+
+    if kind == 'arrow':
+        with span('ingest', 'arrow mmap'):
+            df = read_arrow_mmap(path)
+    elif kind == 'parquet':
+        import pandas as pd
+
+        with span('ingest', 'parquet load'):
+            df = pd.read_parquet(path)
+    elif HAVE_PYARROW:
+        if not os.path.exists(arrow_path(key)):
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with span('ingest', 'csv to arrow'):
+                csv_to_arrow(path, arrow_path(key), sep, progress)
+            evict(keep=key)
+        df = load(key)
+    else:
+        from ingest import read_csv_chunked
+
+        with span('ingest', 'parse'):
+            df = read_csv_chunked(path, sep=sep, progress=progress)[0]
+    return key, df
+
+
+def load_local(path, sep=',', progress=None):
+    """
+    Open a file of the server data directory and make it the current dataset of the session.
+
+    Parameters:
+    path (str): The file, inside DATA_DIR.
+    sep (str): The column separator of a CSV file.
+    progress (callable): Optional callback receiving the fraction of a CSV file converted so far.
+
+    Returns:
+    pd.DataFrame: The loaded DataFrame.
+    """
+    key, df = open_local(path, sep, progress)
+    # Files mapped in place have no copy in the cache, the session reopens them from their path
+    st.session_state['dataset_source'] = (key, path, sep)
+    return set_session_dataset(key, df)
+
+
+def set_session_dataset(key, df):
+    """
+    Make a dataset the current dataset of the session.
+
+    The DataFrame itself lives in the process-wide registry, the session only
+    keeps a handle to it, so sessions opening the same data share one copy.
+
+    Parameters:
+    key (str): The dataset fingerprint.
+    df (pd.DataFrame): The DataFrame.
+
+    Returns:
+    pd.DataFrame: The shared DataFrame.
+    """
+    profile = get_profile(key, df)
+    registry = get_registry()
+    handle = registry.put(key, df, profile['memory_bytes'])
+    # Large datasets get a stratified sample that pages render from first
+    from sampling import dataset_sample
+    with span('ingest', 'stratified sample'):
+        dataset_sample(key, df, profile)
+    previous = st.session_state.get('dataset_handle')
+    st.session_state['dataset_fp'] = key
+    st.session_state['dataset_handle'] = handle
+    st.session_state['profile'] = profile
+    if previous is not None:
+        registry.release(previous)
+    return handle.df
+
+
+def get_profile(key, df):
+    # Profile of a dataset, built once and then read back from the cache
+    profile = load_profile(key)
+    if profile is None:
+        from dataset_profile import build_profile
+        with span('ingest', 'profile'):
+            profile = build_profile(df)
+        store_profile(key, profile)
+    return profile
+
+
+def session_dataset():
+    """
+    Return the current dataset of the session.
+
+    The dataset is looked up by fingerprint in the shared registry, and
+    reloaded from the Parquet cache if no session holds it in memory anymore.
+
+    Returns:
+    pd.DataFrame: The DataFrame, or None if nothing has been uploaded yet.
+    """
+    handle = st.session_state.get('dataset_handle')
+    if handle is not None:
+        return handle.df
+    key = st.session_state.get('dataset_fp')
+    if key is None:
+        return None
+    handle = get_registry().acquire(key)
+    if handle is not None:
+        st.session_state['dataset_handle'] = handle
+        return handle.df
+    df = load(key)
+    source = st.session_state.get('dataset_source')
+    if df is None and source is not None and source[0] == key and os.path.exists(source[1]):
+        key, df = open_local(source[1], source[2])
+    if df is None:
+        return None
+    return set_session_dataset(key, df)
+
+
+def session_profile(df):
+    """
+    Return the profile of the current dataset of the session.
+
+    Parameters:
+    df (pd.DataFrame): The current dataset, profiled on the spot if the session has no profile yet.
+
+    Returns:
+    dict: The profile built by dataset_profile.build_profile.
+    """
+    profile = st.session_state.get('profile')
+    if profile is None:
+        from dataset_profile import build_profile
+        with span('ingest', 'profile'):
+            profile = build_profile(df)
+        st.session_state['profile'] = profile
+    return profile
@@ -0,0 +1,81 @@
+import pandas as pd
+
+# Number of most frequent values kept per categorical column
+TOP_K = 1000
+
+
+def is_categorical(series):
+    return (
+        isinstance(series.dtype, pd.CategoricalDtype)
+        or pd.api.types.is_object_dtype(series)
+        or pd.api.types.is_string_dtype(series)
+    )
+
+
+def is_numerical(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def build_profile(df, top_k=TOP_K):
+    """
+    Compute the summary every page needs from a DataFrame in a single pass over its columns.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    top_k (int): Number of most frequent values kept per categorical column.
+
+    Returns:
+    dict: Column lists by kind, per column statistics, value counts of the
+    categorical columns and summary statistics of the numerical columns.
+    """
+    columns = {}
+    value_counts = {}
+    categorical_columns = []
+    numerical_columns = []
+
+    for column in df.columns:
+        series = df[column]
+        info = {
+            'dtype': str(series.dtype),
+            'nulls': int(series.isna().sum()),
+            'memory_bytes': int(series.memory_usage(deep=True, index=False)),
+        }
+        if is_categorical(series):
+            info['kind'] = 'categorical'
+            categorical_columns.append(column)
+            counts = series.value_counts()
+            info['nunique'] = len(counts)
+            counts = counts.head(top_k).reset_index()
+            counts.columns = [column, 'Count']
+            value_counts[column] = counts
+        elif is_numerical(series):
+            info['kind'] = 'numerical'
+            numerical_columns.append(column)
+            info['nunique'] = int(series.nunique())
+        else:
+            info['kind'] = 'other'
+            info['nunique'] = int(series.nunique())
+        columns[column] = info
+
+    numeric_stats = pd.DataFrame()
+    if numerical_columns:
+        numeric = df[numerical_columns]
+        numeric_stats = pd.DataFrame({
+            'min': numeric.min(),
+            'max': numeric.max(),
+            'mean': numeric.mean(),
+            'std': numeric.std(),
+        })
+        quantiles = numeric.quantile([0.25, 0.5, 0.75]).T
+        quantiles.columns = ['25%', '50%', '75%']
+        numeric_stats = numeric_stats.join(quantiles)
+
+    return {
+        'rows': len(df),
+        'memory_bytes': sum(info['memory_bytes'] for info in columns.values()),
+        'columns': columns,
+        'categorical_columns': categorical_columns,
+        'numerical_columns': numerical_columns,
+        'value_counts': value_counts,
+        'numeric_stats': numeric_stats,
+    }
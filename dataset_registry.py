@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import streamlit as st
+
+# RAM held by datasets no session refers to anymore before they are evicted
+REGISTRY_MAX_BYTES = int(os.environ.get('EDA_REGISTRY_MAX_BYTES', 4 * 1024 ** 3))
+
+
+class DatasetHandle:
+    """
+    A session's reference to a dataset held by the registry.
+
+    Sessions keep the handle in st.session_state instead of the DataFrame.
+    The registry only tracks handles weakly, so when a session ends and its
+    state is dropped, its reference goes away with it.
+    """
+
+    def __init__(self, registry, key):
+        self.key = key
+        self._registry = registry
+
+    @property
+    def df(self):
+        return self._registry.get(self.key)
+
+
+class _Entry:
+    def __init__(self, df, nbytes):
+        self.df = df
+        self.nbytes = nbytes
+        self.handles = weakref.WeakSet()
+        self.last_used = time.time()
+
+
+class DatasetRegistry:
+    """
+    Process-wide store of DataFrames keyed by dataset fingerprint.
+
+    Every session opening the same dataset shares one in-memory copy.
+    Datasets without any live handle are evicted, least recently used
+    first, once the total size exceeds the memory budget.
+    """
+
+    def __init__(self, max_bytes=REGISTRY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return a resident dataset.
+
+        Parameters:
+        key (str): The dataset fingerprint.
+
+        Returns:
+        pd.DataFrame: The DataFrame, or None if it is not resident.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+            return entry.df
+
+    def put(self, key, df, nbytes=None):
+        """
+        Make a dataset resident and take a reference to it.
+
+        If another session already loaded the same dataset, its copy is kept
+        and the new DataFrame is dropped.
+
+        Parameters:
+        key (str): The dataset fingerprint.
+        df (pd.DataFrame): The DataFrame.
+        nbytes (int): Its memory usage, measured if not given.
+
+        Returns:
+        DatasetHandle: The handle to keep in the session.
+        """
+        if nbytes is None:
+            nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(df, nbytes)
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+            # Referenced before evicting, so a dataset larger than the budget is not dropped right away
+            handle = DatasetHandle(self, key)
+            entry.handles.add(handle)
+            self._evict()
+            return handle
+
+    def acquire(self, key):
+        """
+        Take a reference to a resident dataset.
+
+        Parameters:
+        key (str): The dataset fingerprint.
+
+        Returns:
+        DatasetHandle: The handle to keep in the session, or None if the dataset is not resident.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            handle = DatasetHandle(self, key)
+            entry.handles.add(handle)
+            return handle
+
+    def release(self, handle):
+        # Drop a session's reference before the handle is garbage collected
+        with self._lock:
+            entry = self._entries.get(handle.key)
+            if entry is not None:
+                entry.handles.discard(handle)
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held
+        total = sum(entry.nbytes for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if len(entry.handles) == 0:
+                total -= entry.nbytes
+                del self._entries[key]
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def stats(self):
+        """
+        Describe the resident datasets, for the admin view.
+
+        Returns:
+        list: One dict per dataset with its fingerprint, shape, size, number of sessions and idle time.
+        """
+        now = time.time()
+        with self._lock:
+            # Handles of ended sessions may only be collected now, so eviction is retried here
+            self._evict()
+            return [
+                {
+                    'dataset': key[:12],
+                    'rows': len(entry.df),
+                    'columns': len(entry.df.columns),
+                    'bytes': entry.nbytes,
+                    'sessions': len(entry.handles),
+                    'idle_seconds': round(now - entry.last_used),
+                }
+                for key, entry in self._entries.items()
+            ]
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+
+@st.cache_resource
+def get_registry():
+    # One registry per server process, shared by every session
+    return DatasetRegistry()
@@ -0,0 +1,66 @@
+import zipfile
+from contextlib import closing
+from io import BytesIO
+
+from figures import close_figure
+from perf import span
+from plot_stream import render_window
+from render_cache import render_cache
+
+
+def export_zip(plots, progress=None):
+    """
+    Render plots into a ZIP archive of PNG files.
+
+    Plots already in the render cache (because they were shown on screen) are
+    reused, the others are rendered through plot_stream.render_window and
+    written to the archive as they complete.
+
+    Parameters:
+    plots (list): (file name, render cache key, renderer, arguments) tuples,
+    with renderers and arguments as accepted by charts.render_png.
+    progress (callable): Optional callback receiving the fraction of the plots written so far.
+    A Streamlit element update there lets a rerun interrupt the export and cancel its renders.
+
+    Returns:
+    bytes: The ZIP archive.
+    """
+    buffer = BytesIO()
+    # PNG data is already compressed, deflating it again only costs time
+    with span('encode', 'zip export'), zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        missing = []
+        for filename, key, renderer, args in plots:
+            png = render_cache.get(key) if key is not None else None
+            if png is None:
+                missing.append((filename, key, renderer, args))
+            else:
+                archive.writestr(filename, png)
+
+        # Bounded like the plots shown on screen, so an export never holds the whole shared pool
+        with closing(render_window([(key, renderer, args) for _, key, renderer, args in missing])) as renders:
+            for written, (i, png) in enumerate(renders, 1):
+                archive.writestr(missing[i][0], png)
+                if progress is not None:
+                    progress((len(plots) - len(missing) + written) / len(plots))
+    return buffer.getvalue()
+
+
+def export_pdf(plots):
+    """
+    Render plots as the pages of a single vector PDF.
+
+    Parameters:
+    plots (list): (file name, render cache key, renderer, arguments) tuples, as for export_zip.
+
+    Returns:
+    bytes: The PDF document.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    buffer = BytesIO()
+    with span('encode', 'pdf export'), PdfPages(buffer) as pdf:
+        for _, _, renderer, args in plots:
+            fig = renderer(*args)
+            pdf.savefig(fig)
+            close_figure(fig)
+    return buffer.getvalue()
@@ -0,0 +1,85 @@
+import os
+from contextlib import contextmanager
+from io import BytesIO
+
+from perf import span
+
+# Never pick an interactive backend on the server, even when seaborn imports pyplot.
+# Set through the environment so matplotlib itself is only imported on first use.
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+def new_figure(width=10, height=6, dpi=None):
+    """
+    Create a figure bound to its own Agg canvas.
+
+    Unlike plt.figure(), the figure is not registered with pyplot, so
+    concurrent sessions never draw on each other's "current" figure and
+    nothing keeps it alive once the caller drops it.
+
+    Parameters:
+    width (float): Width in inches.
+    height (float): Height in inches.
+    dpi (float): Resolution, matplotlib's default if None.
+
+    Returns:
+    Figure: The figure.
+    """
+    # matplotlib is imported on first use, it is one of the slowest imports of the app
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def close_figure(fig):
+    # Drop the artists of a figure right away instead of waiting for the garbage collector
+    fig.clear()
+
+
+@contextmanager
+def figure(width=10, height=6, dpi=None):
+    """
+    Context manager yielding a new figure that is closed when the block exits.
+
+    Parameters:
+    width (float): Width in inches.
+    height (float): Height in inches.
+    dpi (float): Resolution, matplotlib's default if None.
+
+    Yields:
+    Figure: The figure.
+    """
+    fig = new_figure(width, height, dpi)
+    try:
+        yield fig
+    finally:
+        close_figure(fig)
+
+
+def figure_to_png(fig):
+    # Encode a figure as PNG bytes
+    with span('encode', 'png'):
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png')
+        return buffer.getvalue()
+
+
+def render_figure(draw, width=10, height=6, dpi=None):
+    """
+    Draw into a new figure, encode it as PNG and close it.
+
+    Parameters:
+    draw (callable): Function receiving the figure and drawing on it.
+    width (float): Width in inches.
+    height (float): Height in inches.
+    dpi (float): Resolution, matplotlib's default if None.
+
+    Returns:
+    bytes: The PNG image.
+    """
+    with figure(width, height, dpi) as fig:
+        with span('render', getattr(draw, '__qualname__', 'figure')):
+            draw(fig)
+        return figure_to_png(fig)
@@ -0,0 +1,450 @@
+import importlib.util
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Excel workbooks are read with calamine when python-calamine is installed,
+# otherwise streamed row by row with openpyxl in read-only mode
+HAVE_CALAMINE = importlib.util.find_spec('python_calamine') is not None
+
+# Arrow IPC files are memory-mapped and CSV files converted in blocks with
+# pyarrow, without it local files are read into memory with pandas
+HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# Rows read per chunk when ingesting a CSV file
+CHUNK_SIZE = 100_000
+
+# Bytes of CSV text parsed per block when converting a local file
+CSV_BLOCK_SIZE = 16 * 1024 ** 2
+
+# Formats opened from the local data directory, by file extension
+LOCAL_FORMATS = {
+    '.csv': 'csv',
+    '.tsv': 'csv',
+    '.txt': 'csv',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.parquet': 'parquet',
+}
+
+# Object columns whose distinct values stay below this share of the rows
+# are stored as 'category'
+CATEGORY_RATIO = 0.5
+
+
+def fits_float32(values):
+    """
+    Tell whether float values survive a round trip through float32 unchanged.
+
+    pd.to_numeric(downcast='float') only checks that the values are in the
+    float32 range, so it turns 19.99 into 19.989999771118164. Columns are
+    narrowed only when this check passes.
+
+    Parameters:
+    values (np.ndarray): The values, NaN for missing ones.
+
+    Returns:
+    bool: True if every value is exactly representable as float32.
+    """
+    values = np.asarray(values, dtype='float64')
+    with np.errstate(over='ignore'):
+        narrowed = values.astype('float32').astype('float64')
+    return bool(np.all((narrowed == values) | np.isnan(values)))
+
+
+def shrink_dtypes(df):
+    """
+    Convert the columns of a DataFrame to the smallest dtypes that hold their values exactly.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to shrink, modified in place.
+
+    Returns:
+    pd.DataFrame: The same DataFrame with compact dtypes.
+    """
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            if fits_float32(series.to_numpy(dtype='float64', na_value=np.nan)):
+                df[column] = series.astype('float32')
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if len(series) and series.nunique(dropna=True) < CATEGORY_RATIO * len(series):
+                df[column] = series.astype('category')
+    return df
+
+
+def _as_text(piece):
+    # Values as the CSV text they were parsed from: integral floats lost their
+    # decimals to NaN upcasting only, so they are written as integers
+    if pd.api.types.is_float_dtype(piece):
+        values = piece.dropna()
+        if (values == values.round()).all():
+            piece = piece.astype('Int64')
+    return piece.astype(str)
+
+
+def _concat_column(pieces):
+    # Categorical pieces with categories of the same type are merged by unioning
+    # their categories. Otherwise categorical pieces are decoded to the type of
+    # their categories, and pieces mixing numbers and text become text, the way
+    # a whole-file read parses such a column.
+    if (
+        all(isinstance(piece.dtype, pd.CategoricalDtype) for piece in pieces)
+        and len({piece.cat.categories.dtype for piece in pieces}) == 1
+    ):
+        return pd.Series(union_categoricals(pieces), name=pieces[0].name)
+    pieces = [
+        piece.astype(piece.cat.categories.dtype) if isinstance(piece.dtype, pd.CategoricalDtype) else piece
+        for piece in pieces
+    ]
+    numeric = [pd.api.types.is_numeric_dtype(piece) for piece in pieces]
+    if any(numeric) and not all(numeric):
+        pieces = [_as_text(piece) for piece in pieces]
+    return pd.concat(pieces, ignore_index=True)
+
+
+def concat_chunks(chunks):
+    """
+    Concatenate shrunk chunks while keeping categorical columns categorical.
+
+    Parameters:
+    chunks (list): DataFrames with the same columns, as returned by shrink_dtypes.
+
+    Returns:
+    pd.DataFrame: The combined DataFrame.
+    """
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    columns = chunks[0].columns
+    df = pd.DataFrame({
+        column: _concat_column([chunk[column].reset_index(drop=True) for chunk in chunks])
+        for column in columns
+    })
+    # A column that was only narrowed in some chunks may have been upcast
+    # again by the concatenation
+    return shrink_dtypes(df)
+
+
+def read_csv_chunked(file, sep=',', chunksize=CHUNK_SIZE, progress=None):
+    """
+    Read a CSV file chunk by chunk, shrinking the dtypes of every chunk as it is read.
+
+    Parameters:
+    file: A path or file-like object such as a Streamlit UploadedFile.
+    sep (str): The column separator.
+    chunksize (int): Number of rows read per chunk.
+    progress (callable): Optional callback receiving the fraction of the file read so far.
+
+    Returns:
+    tuple: The compact DataFrame, the memory in bytes it would have used with
+    default dtypes and the memory in bytes it actually uses.
+    """
+    total_size = getattr(file, 'size', None)
+    raw_bytes = 0
+    chunks = []
+    for chunk in pd.read_csv(file, sep=sep, chunksize=chunksize):
+        raw_bytes += int(chunk.memory_usage(deep=True).sum())
+        chunks.append(shrink_dtypes(chunk))
+        if progress is not None and total_size and hasattr(file, 'tell'):
+            progress(min(file.tell() / total_size, 1.0))
+
+    df = concat_chunks(chunks)
+    if progress is not None:
+        progress(1.0)
+    return df, raw_bytes, int(df.memory_usage(deep=True).sum())
+
+
+def excel_sheet_names(file):
+    """
+    List the sheets of an Excel workbook without reading their cells.
+
+    Parameters:
+    file: A path or file-like object such as a Streamlit UploadedFile.
+
+    Returns:
+    list: The sheet names, in workbook order.
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    if HAVE_CALAMINE:
+        from python_calamine import CalamineWorkbook
+
+        if hasattr(file, 'read'):
+            names = CalamineWorkbook.from_filelike(file).sheet_names
+        else:
+            names = CalamineWorkbook.from_path(file).sheet_names
+    else:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True)
+        names = workbook.sheetnames
+        workbook.close()
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return names
+
+
+def _read_excel_openpyxl(file, sheet, chunksize, progress):
+    # Stream the rows of a read-only worksheet into shrunk chunks
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        total_rows = worksheet.max_row
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return [], 0
+        header = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+
+        raw_bytes = 0
+        chunks = []
+        buffer = []
+        read = 1
+        for row in rows:
+            buffer.append(row[:len(header)])
+            if len(buffer) == chunksize:
+                chunk = pd.DataFrame(buffer, columns=header).infer_objects()
+                raw_bytes += int(chunk.memory_usage(deep=True).sum())
+                chunks.append(shrink_dtypes(chunk))
+                read += len(buffer)
+                buffer = []
+                if progress is not None and total_rows:
+                    progress(min(read / total_rows, 1.0))
+        if buffer or not chunks:
+            chunk = pd.DataFrame(buffer, columns=header).infer_objects()
+            raw_bytes += int(chunk.memory_usage(deep=True).sum())
+            chunks.append(shrink_dtypes(chunk))
+        return chunks, raw_bytes
+    finally:
+        workbook.close()
+
+
+def read_excel_sheet(file, sheet=None, chunksize=CHUNK_SIZE, progress=None):
+    """
+    Read one sheet of an Excel workbook with the fastest available engine and compact dtypes.
+
+    Parameters:
+    file: A path or file-like object such as a Streamlit UploadedFile.
+    sheet (str): The sheet name, the first sheet if None.
+    chunksize (int): Number of rows per chunk when streaming with openpyxl.
+    progress (callable): Optional callback receiving the fraction of the sheet read so far.
+
+    Returns:
+    tuple: The compact DataFrame, the memory in bytes it would have used with
+    default dtypes and the memory in bytes it actually uses.
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    if HAVE_CALAMINE:
+        # calamine parses the whole sheet natively, far faster than openpyxl
+        df = pd.read_excel(file, sheet_name=sheet if sheet is not None else 0, engine='calamine')
+        raw_bytes = int(df.memory_usage(deep=True).sum())
+        df = shrink_dtypes(df)
+    else:
+        chunks, raw_bytes = _read_excel_openpyxl(file, sheet, chunksize, progress)
+        df = concat_chunks(chunks)
+    if progress is not None:
+        progress(1.0)
+    return df, raw_bytes, int(df.memory_usage(deep=True).sum())
+
+
+def list_local_files(data_dir):
+    """
+    List the files of a data directory that can be opened in place.
+
+    Parameters:
+    data_dir (str): The data directory, searched recursively.
+
+    Returns:
+    list: Paths relative to the data directory, sorted.
+    """
+    names = []
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = [name for name in dirs if not name.startswith('.')]
+        for name in files:
+            if os.path.splitext(name)[1].lower() in LOCAL_FORMATS:
+                names.append(os.path.relpath(os.path.join(root, name), data_dir))
+    return sorted(names)
+
+
+def resolve_local_path(data_dir, name):
+    """
+    Turn a name picked in the data directory into an absolute path inside it.
+
+    Parameters:
+    data_dir (str): The data directory.
+    name (str): A path relative to the data directory.
+
+    Returns:
+    str: The resolved path.
+
+    Raises:
+    ValueError: If the path leaves the data directory or has an unknown extension.
+    """
+    root = os.path.realpath(data_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"{name} is outside the data directory")
+    if os.path.splitext(path)[1].lower() not in LOCAL_FORMATS:
+        raise ValueError(f"{name} is not a CSV, Arrow or Parquet file")
+    return path
+
+
+def read_arrow_mmap(path):
+    """
+    Open an Arrow IPC (Feather v2) file through a memory map.
+
+    Columns without missing values are not copied: the DataFrame points into
+    the mapped file and the operating system pages the data in as it is read.
+    Compressed files and columns with nulls are decoded into memory.
+
+    Parameters:
+    path (str): The Arrow IPC or Feather file.
+
+    Returns:
+    pd.DataFrame: The DataFrame.
+    """
+    if not HAVE_PYARROW:
+        return pd.read_feather(path)
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    try:
+        table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    except pa.ArrowInvalid:
+        # Feather v1 files are not Arrow IPC files
+        return pd.read_feather(path)
+    return table.to_pandas(split_blocks=True)
+
+
+def _fill_batch(batch):
+    # Float nulls become NaN, so the columns stay zero-copy when the file is memory-mapped
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = [
+        pc.fill_null(column, float('nan')) if pa.types.is_floating(column.type) else column
+        for column in batch.columns
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=batch.schema)
+
+
+def _csv_to_arrow(path, out_path, sep, column_types, progress):
+    # Returns the float columns inferred from the file whose values all fit float32
+    import pyarrow as pa
+    import pyarrow.csv as csv
+    import pyarrow.ipc as ipc
+
+    total_size = os.path.getsize(path)
+    with open(path, 'rb') as source:
+        reader = csv.open_csv(
+            source,
+            read_options=csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            parse_options=csv.ParseOptions(delimiter=sep),
+            convert_options=csv.ConvertOptions(column_types=column_types),
+        )
+        # Columns forced to float64 by column_types are never narrowed
+        narrow = {
+            field.name for field in reader.schema
+            if pa.types.is_float64(field.type) and field.name not in (column_types or {})
+        }
+        with pa.OSFile(out_path, 'wb') as sink, ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                batch = _fill_batch(batch)
+                narrow = {
+                    name for name in narrow
+                    if fits_float32(batch.column(name).to_numpy(zero_copy_only=False))
+                }
+                writer.write_batch(batch)
+                if progress is not None and total_size:
+                    progress(min(source.tell() / total_size, 1.0))
+    return narrow
+
+
+def _narrow_arrow(path, out_path, columns):
+    # Rewrite an Arrow IPC file with the given float64 columns as float32, one batch at a time
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    with pa.memory_map(path, 'r') as source:
+        reader = ipc.open_file(source)
+        schema = pa.schema([
+            pa.field(field.name, pa.float32()) if field.name in columns else field
+            for field in reader.schema
+        ])
+        with pa.OSFile(out_path, 'wb') as sink, ipc.new_file(sink, schema) as writer:
+            for i in range(reader.num_record_batches):
+                writer.write_batch(reader.get_batch(i).cast(schema))
+
+
+def csv_to_arrow(path, out_path, sep=',', progress=None):
+    """
+    Convert a CSV file into an uncompressed Arrow IPC file, one block at a time.
+
+    Only one block of the CSV is in memory at once, so files larger than RAM
+    can be converted. Float columns are stored as float32 when fits_float32
+    holds for all of their values, the rule shrink_dtypes applies to uploads,
+    which takes a second pass over the converted file. The result is meant to be opened
+    with read_arrow_mmap.
+
+    Parameters:
+    path (str): The CSV file.
+    out_path (str): The Arrow IPC file written.
+    sep (str): The column separator.
+    progress (callable): Optional callback receiving the fraction of the file converted so far.
+
+    Returns:
+    None
+    """
+    import pyarrow as pa
+
+    # Written under temporary names so concurrent sessions never map a partial file
+    tmp_path = f"{out_path}.{uuid.uuid4().hex}.tmp"
+    narrow_path = f"{tmp_path}.narrow"
+    try:
+        try:
+            narrow = _csv_to_arrow(path, tmp_path, sep, None, progress)
+        except pa.ArrowInvalid:
+            # Types are inferred from the first block, a later block may not fit
+            # them, e.g. an integer column with decimals further down. Retry
+            # with numbers as float64 and everything else as strings.
+            import pyarrow.csv as csv
+
+            with open(path, 'rb') as source:
+                schema = csv.open_csv(source, parse_options=csv.ParseOptions(delimiter=sep)).schema
+            column_types = {
+                field.name: pa.float64() if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+                else pa.string()
+                for field in schema
+            }
+            narrow = _csv_to_arrow(path, tmp_path, sep, column_types, progress)
+        if narrow:
+            _narrow_arrow(tmp_path, narrow_path, narrow)
+            os.replace(narrow_path, tmp_path)
+        os.replace(tmp_path, out_path)
+    finally:
+        for leftover in (tmp_path, narrow_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    if progress is not None:
+        progress(1.0)
+
+
+def format_bytes(num_bytes):
+    # Human readable size, e.g. '12.3 MB'
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{num_bytes} B"
+        num_bytes /= 1024
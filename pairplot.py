@@ -0,0 +1,148 @@
+import numpy as np
+
+from figures import close_figure, new_figure
+from perf import span
+from process_pool import get_process_pool
+
+# Largest grid drawn by the pairplot, wider selections are truncated with a warning
+MAX_PAIRPLOT_COLUMNS = 10
+
+# Number of bins of the diagonal histograms and of the off-diagonal density panels
+PAIRPLOT_BINS = 40
+
+# Rows binned at once, bounding the copies of the selected columns
+PAIRPLOT_CHUNK_ROWS = 500_000
+
+# Size of a single panel
+PANEL_INCHES = 2.0
+PANEL_DPI = 80
+
+
+def pairplot_summaries(df, columns, bins=PAIRPLOT_BINS):
+    """
+    Compute the histograms and 2D bin counts of every panel of a pairplot.
+
+    Rows are binned in chunks of PAIRPLOT_CHUNK_ROWS, all columns of a chunk
+    at once, so each panel only costs a bincount over integer bin indices,
+    nothing is drawn per point and only one chunk is copied at a time.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    columns (list): The numerical columns of the grid.
+    bins (int): Number of bins along each axis.
+
+    Returns:
+    tuple: The bin edges of every column and a dict mapping (row, column)
+    positions to counts, 1D on the diagonal and 2D elsewhere.
+    """
+    # Column ranges from pandas reductions, which skip NaN without copying the columns
+    low = np.array([df[column].min() for column in columns], dtype='float64')
+    high = np.array([df[column].max() for column in columns], dtype='float64')
+    low = np.nan_to_num(low)
+    high = np.where(np.isnan(high) | (high <= low), low + 1, high)
+
+    size = len(columns)
+    counts = {}
+    for i in range(size):
+        counts[(i, i)] = np.zeros(bins, dtype='int64')
+        for j in range(i + 1, size):
+            counts[(i, j)] = np.zeros(bins * bins, dtype='int64')
+
+    for start in range(0, len(df), PAIRPLOT_CHUNK_ROWS):
+        values = df[columns].iloc[start:start + PAIRPLOT_CHUNK_ROWS].to_numpy(dtype='float64', na_value=np.nan)
+        valid = np.isfinite(values)
+
+        # Bin index of every cell, -1 for missing values
+        scaled = (values - low) / (high - low) * bins
+        index = np.minimum(np.nan_to_num(scaled, nan=-1).astype('int32'), bins - 1)
+        index[~valid] = -1
+        del values, scaled
+
+        for i in range(size):
+            counts[(i, i)] += np.bincount(index[valid[:, i], i], minlength=bins)
+            for j in range(i + 1, size):
+                both = valid[:, i] & valid[:, j]
+                counts[(i, j)] += np.bincount(index[both, i] * bins + index[both, j], minlength=bins * bins)
+
+    edges = [np.linspace(low[i], high[i], bins + 1) for i in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            grid = counts[(i, j)].reshape(bins, bins)
+            # Panels are drawn with pcolormesh, which expects [y bin, x bin] arrays, and
+            # panel (row, column) has the column variable on x and the row variable on y
+            counts[(i, j)] = grid
+            counts[(j, i)] = grid.T
+    return edges, counts
+
+
+def render_panel(task):
+    """
+    Render a single pairplot panel into an RGBA pixel array.
+
+    Parameters:
+    task (tuple): Row, column, counts, x edges, y edges, x label, y label and grid size.
+
+    Returns:
+    tuple: The row, the column and the RGBA array of the panel.
+    """
+    from matplotlib.colors import LogNorm
+
+    row, column, counts, x_edges, y_edges, x_label, y_label, size = task
+    fig = new_figure(PANEL_INCHES, PANEL_INCHES, PANEL_DPI)
+    ax = fig.add_axes([0.22, 0.2, 0.74, 0.74])
+    if row == column:
+        ax.stairs(counts, x_edges, fill=True, color='tab:blue')
+    else:
+        grid = counts.astype('float64')
+        grid[grid == 0] = np.nan
+        if np.isfinite(grid).any():
+            ax.pcolormesh(x_edges, y_edges, grid, norm=LogNorm(), cmap='viridis')
+    ax.tick_params(labelsize=5)
+    # Only the outer panels carry axis labels
+    if row == size - 1:
+        ax.set_xlabel(x_label, fontsize=7)
+    else:
+        ax.tick_params(labelbottom=False)
+    if column == 0:
+        ax.set_ylabel(y_label, fontsize=7)
+    else:
+        ax.tick_params(labelleft=False)
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba()).copy()
+    close_figure(fig)
+    return row, column, pixels
+
+
+def build_pairplot(df, columns, bins=PAIRPLOT_BINS):
+    """
+    Build a pairplot image from binned summaries, rendering its panels in parallel.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    columns (list): The numerical columns of the grid.
+    bins (int): Number of bins along each axis.
+
+    Returns:
+    np.ndarray: The RGBA image of the whole grid.
+    """
+    with span('compute', 'pairplot summaries'):
+        edges, counts = pairplot_summaries(df, columns, bins)
+    size = len(columns)
+    tasks = [
+        (row, column, counts[(row, column)], edges[column], edges[row], columns[column], columns[row], size)
+        for row in range(size)
+        for column in range(size)
+    ]
+
+    with span('render', 'pairplot panels'):
+        pool = get_process_pool()
+        if pool is not None and len(tasks) > 1:
+            panels = list(pool.map(render_panel, tasks))
+        else:
+            panels = [render_panel(task) for task in tasks]
+
+    # Compose the panels into one image
+    grid = [[None] * size for _ in range(size)]
+    for row, column, pixels in panels:
+        grid[row][column] = pixels
+    return np.vstack([np.hstack(images) for images in grid])
@@ -0,0 +1,208 @@
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+# Directory of the trace files, one JSONL file per session
+TRACE_DIR = os.environ.get(
+    'EDA_TRACE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'stremlitweb', 'traces')
+)
+
+# Set EDA_TRACE=0 to stop writing trace files, the sidebar panel keeps working
+TRACE_ENABLED = os.environ.get('EDA_TRACE', '1') != '0'
+
+# Stages of the hot path, in pipeline order
+STAGES = ['ingest', 'compute', 'render', 'encode']
+
+# Number of functions listed in the profile of a rerun
+PROFILE_LINES = 30
+
+
+def rss_bytes():
+    # Current resident set size of the process, shared by every session of the server
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return 0
+
+
+def _script_context():
+    # The Streamlit script run of the calling thread, None in render workers and plain scripts
+    if 'streamlit' not in sys.modules:
+        return None
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def _rerun_state():
+    # Spans of the current rerun, kept in the session state
+    ctx = _script_context()
+    if ctx is None:
+        return None
+    import streamlit as st
+    if 'perf' not in st.session_state:
+        st.session_state['perf'] = {'rerun': 0, 'spans': [], 'stack': [], 'profiler': None}
+    return st.session_state['perf']
+
+
+@contextmanager
+def span(stage, name):
+    """
+    Time a block of the hot path and record it in the current rerun.
+
+    Outside a Streamlit script run (render workers, benchmarks) nothing is recorded.
+
+    Parameters:
+    stage (str): One of STAGES.
+    name (str): What the block does, e.g. 'parquet load' or 'countplot'.
+
+    Yields:
+    None
+    """
+    state = _rerun_state()
+    if state is None:
+        yield
+        return
+    record = {'stage': stage, 'name': name, 'depth': len(state['stack']), 'children_ms': 0.0}
+    # Listed in start order, so nested spans follow their parent
+    state['spans'].append(record)
+    state['stack'].append(record)
+    rss = rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        state['stack'].pop()
+        record['ms'] = round(elapsed, 3)
+        # Time spent in this block itself, nested spans excluded
+        record['self_ms'] = round(elapsed - record.pop('children_ms'), 3)
+        record['rss_delta_mb'] = round((rss_bytes() - rss) / 1024 ** 2, 2)
+        if state['stack']:
+            state['stack'][-1]['children_ms'] += elapsed
+
+
+def begin_rerun():
+    """
+    Start recording the spans of a new rerun, called at the top of every page.
+
+    If the profile of this rerun was requested in the performance panel,
+    cProfile starts here and stops in perf_panel.
+
+    Returns:
+    None
+    """
+    state = _rerun_state()
+    if state is None:
+        return
+    state['rerun'] += 1
+    state['spans'] = []
+    state['stack'] = []
+    state['start'] = time.perf_counter()
+    import streamlit as st
+    # The click on the profile button reruns the page itself, the rerun after it is profiled
+    if st.session_state.get('perf_profile_next') and not st.session_state.get('perf_profile_button'):
+        st.session_state['perf_profile_next'] = False
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            state['profiler'] = profiler
+        except ValueError:
+            # Another profiler is already active in this process
+            state['profiler'] = None
+
+
+def _request_profile():
+    import streamlit as st
+    st.session_state['perf_profile_next'] = True
+
+
+def _page_name():
+    main = sys.modules.get('__main__')
+    return os.path.basename(getattr(main, '__file__', '') or '')
+
+
+def _write_trace(ctx, state, spans):
+    # Append the spans of the rerun to the trace file of the session, one JSON object per line
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    base = {'ts': round(time.time(), 3), 'session': ctx.session_id, 'page': _page_name(), 'rerun': state['rerun']}
+    with open(os.path.join(TRACE_DIR, f"{ctx.session_id}.jsonl"), 'a') as f:
+        for record in spans:
+            f.write(json.dumps({**base, **record}) + '\n')
+
+
+def perf_panel():
+    """
+    Finish the current rerun: write its spans to the trace file and show the
+    optional performance panel in the sidebar. Called at the end of every page.
+
+    Returns:
+    None
+    """
+    import streamlit as st
+
+    state = _rerun_state()
+    if state is None:
+        return
+    # Spans left open by an exception or st.stop() are dropped
+    spans = [record for record in state['spans'] if 'ms' in record]
+    total_ms = (time.perf_counter() - state.get('start', time.perf_counter())) * 1000
+    profiler = state['profiler']
+    state['profiler'] = None
+    if profiler is not None:
+        profiler.disable()
+
+    ctx = _script_context()
+    if TRACE_ENABLED and spans:
+        try:
+            _write_trace(ctx, state, spans)
+        except OSError:
+            pass
+
+    if not st.sidebar.checkbox("Show performance", key='perf_show'):
+        return
+    with st.sidebar.expander("Performance", expanded=True):
+        st.caption(f"Rerun {state['rerun']}: {total_ms:.0f} ms, process RSS {rss_bytes() / 1024 ** 2:.0f} MB")
+        # Exclusive time per stage, so nested spans are not counted twice
+        totals = {stage: 0.0 for stage in STAGES}
+        for record in spans:
+            totals[record['stage']] = totals.get(record['stage'], 0.0) + record['self_ms']
+        st.dataframe([{'stage': stage, 'ms': round(ms, 1)} for stage, ms in totals.items()], hide_index=True)
+        if spans:
+            st.dataframe(
+                [
+                    {
+                        'span': '  ' * record['depth'] + record['name'],
+                        'stage': record['stage'],
+                        'ms': round(record['ms'], 1),
+                        'RSS MB': record['rss_delta_mb'],
+                    }
+                    for record in spans
+                ],
+                hide_index=True,
+            )
+        st.button("Profile next rerun", key='perf_profile_button', on_click=_request_profile)
+        if st.session_state.get('perf_profile_next'):
+            st.caption("The next rerun will be profiled")
+
+        if profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            st.code(output.getvalue())
+            # The pstats file format, readable with snakeviz or python -m pstats
+            data = marshal.dumps(pstats.Stats(profiler).stats)
+            st.download_button(
+                "Download profile", data=data, file_name=f"rerun-{state['rerun']}.prof",
+                mime='application/octet-stream', on_click='ignore',
+            )
+
@@ -0,0 +1,96 @@
+import os
+from collections import deque
+from contextlib import closing
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import streamlit as st
+
+from charts import render_png
+from perf import span
+from process_pool import RENDER_WORKERS, get_process_pool
+from render_cache import render_cache
+
+# Plots of one session rendering at once. The pool is shared by every session,
+# so a long request only ever holds this many workers and the renders of other
+# sessions queue behind a handful of plots instead of all of them.
+RENDER_SESSION_LIMIT = int(os.environ.get('EDA_RENDER_SESSION_LIMIT', max(1, RENDER_WORKERS // 2)))
+
+
+def _cache_result(key):
+    # Renders finishing after a rerun interrupted the page still fill the render cache
+    def done(future):
+        if key is not None and not future.cancelled() and future.exception() is None:
+            render_cache.put(key, future.result())
+    return done
+
+
+def render_window(plots):
+    """
+    Render plots across the process pool, at most RENDER_SESSION_LIMIT at a time.
+
+    Plots are yielded in completion order. Closing the generator, e.g. when a
+    rerun interrupts the page, cancels the queued renders: plots not submitted
+    yet are never rendered and running ones only land in the render cache.
+
+    Parameters:
+    plots (list): (render cache key, renderer, arguments) tuples, with renderers
+    and arguments as accepted by charts.render_png.
+
+    Yields:
+    tuple: The position of the plot in plots and its PNG image.
+    """
+    pool = get_process_pool()
+    if pool is None or len(plots) <= 1:
+        for i, (key, renderer, args) in enumerate(plots):
+            yield i, render_cache.get_or_render(key, lambda: render_png(renderer, *args))
+        return
+
+    queue = deque(enumerate(plots))
+    running = {}
+    try:
+        with span('render', f"{len(plots)} plots"):
+            while queue or running:
+                while queue and len(running) < RENDER_SESSION_LIMIT:
+                    i, (key, renderer, args) = queue.popleft()
+                    future = pool.submit(render_png, renderer, *args)
+                    future.add_done_callback(_cache_result(key))
+                    running[future] = i
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield running.pop(future), future.result()
+    finally:
+        for future in running:
+            future.cancel()
+
+
+def show_plots(titles, plots):
+    """
+    Show several plots, each in its own placeholder as soon as it is rendered.
+
+    Cached plots are shown right away, the others are rendered through
+    render_window and shown in completion order.
+
+    Parameters:
+    titles (list): The heading written above every plot.
+    plots (list): (file name, render cache key, renderer, arguments) tuples,
+    with renderers and arguments as accepted by charts.render_png.
+
+    Returns:
+    None
+    """
+    placeholders = []
+    pending = []
+    for title, (_, key, renderer, args) in zip(titles, plots):
+        st.write(title)
+        placeholder = st.empty()
+        png = render_cache.get(key) if key is not None else None
+        if png is not None:
+            placeholder.image(png)
+        else:
+            placeholder.caption("Rendering...")
+            placeholders.append(placeholder)
+            pending.append((key, renderer, args))
+
+    with closing(render_window(pending)) as renders:
+        for i, png in renders:
+            placeholders[i].image(png)
@@ -0,0 +1,214 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from dataset_cache import HAVE_PYARROW, session_profile
+
+# Rows sent to the browser per preview page
+PAGE_SIZE = 50
+
+# Memory held by cached sort orders and filter results, each holds up to one integer per row
+INDEX_CACHE_MAX_BYTES = int(os.environ.get('EDA_INDEX_CACHE_MAX_BYTES', 256 * 1024 ** 2))
+
+# Number of serialized preview pages kept in memory
+PAGE_CACHE_SIZE = 256
+
+_index_cache = OrderedDict()
+_page_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _nbytes(positions):
+    return positions.nbytes
+
+
+def _cached(cache, limit, key, compute, size=None):
+    # Shared LRU lookup of the preview caches, a key without fingerprint is never cached.
+    # Every entry takes size(value) of the limit, or one entry when size is None
+    if key[0] is not None:
+        with _cache_lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+    value = compute()
+    if key[0] is not None:
+        size = size or (lambda value: 1)
+        # A value larger than the whole limit is simply not cached
+        if size(value) > limit:
+            return value
+        with _cache_lock:
+            cache[key] = value
+            while sum(size(entry) for entry in cache.values()) > limit:
+                cache.popitem(last=False)
+    return value
+
+
+def sort_order(df, dataset_fp, column, ascending=True):
+    """
+    Return the row positions of a dataset sorted by one column, computed once per column and direction.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    dataset_fp (str): The dataset fingerprint, None disables caching.
+    column (str): The sort column.
+    ascending (bool): The sort direction, missing values always come last.
+
+    Returns:
+    np.ndarray: The row positions in sorted order.
+    """
+    def compute():
+        values = df[column].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, na_position='last', kind='stable').index
+        return order.to_numpy(dtype='int64')
+
+    return _cached(_index_cache, INDEX_CACHE_MAX_BYTES, (dataset_fp, 'sort', column, ascending), compute, _nbytes)
+
+
+def filter_positions(df, dataset_fp, column, value):
+    """
+    Return the row positions matching a filter, computed once per filter.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    dataset_fp (str): The dataset fingerprint, None disables caching.
+    column (str): The filtered column.
+    value: A category to match, or a (low, high) tuple of bounds for a numerical column.
+
+    Returns:
+    np.ndarray: The matching row positions in ascending order.
+    """
+    def compute():
+        series = df[column]
+        if isinstance(value, tuple):
+            mask = series.between(*value).to_numpy(dtype=bool, na_value=False)
+        else:
+            mask = (series == value).to_numpy(dtype=bool, na_value=False)
+        return np.flatnonzero(mask)
+
+    return _cached(_index_cache, INDEX_CACHE_MAX_BYTES, (dataset_fp, 'filter', column, value), compute, _nbytes)
+
+
+def preview_positions(df, dataset_fp, sort_column=None, ascending=True, filter_column=None, filter_value=None):
+    """
+    Return the row positions of a sorted and filtered view of a dataset.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    dataset_fp (str): The dataset fingerprint, None disables caching.
+    sort_column (str): The sort column, None keeps the file order.
+    ascending (bool): The sort direction.
+    filter_column (str): The filtered column, None keeps every row.
+    filter_value: The filter, see filter_positions.
+
+    Returns:
+    np.ndarray: The row positions of the view, or None for every row in file order.
+    """
+    if sort_column is None and filter_column is None:
+        return None
+    if filter_column is None:
+        return sort_order(df, dataset_fp, sort_column, ascending)
+    matching = filter_positions(df, dataset_fp, filter_column, filter_value)
+    if sort_column is None:
+        return matching
+
+    def compute():
+        # Keep the sorted positions that pass the filter, in sorted order
+        mask = np.zeros(len(df), dtype=bool)
+        mask[matching] = True
+        order = sort_order(df, dataset_fp, sort_column, ascending)
+        return order[mask[order]]
+
+    key = (dataset_fp, 'view', sort_column, ascending, filter_column, filter_value)
+    return _cached(_index_cache, INDEX_CACHE_MAX_BYTES, key, compute, _nbytes)
+
+
+def preview_page(df, dataset_fp, view, page, page_size=PAGE_SIZE):
+    """
+    Slice one page of rows out of a view of a dataset.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    dataset_fp (str): The dataset fingerprint, None disables caching.
+    view (tuple): Sort column, ascending, filter column and filter value, as taken by preview_positions.
+    page (int): The page number, starting at 0.
+    page_size (int): Rows per page.
+
+    Returns:
+    tuple: The page, as an Arrow table when pyarrow is available, and the number of rows in the view.
+    """
+    positions = preview_positions(df, dataset_fp, *view)
+    total = len(df) if positions is None else len(positions)
+
+    def compute():
+        start = page * page_size
+        stop = min(start + page_size, total)
+        rows = np.arange(start, stop) if positions is None else positions[start:stop]
+        # The original row numbers are kept as the index
+        rows_df = df.iloc[rows].set_axis(rows)
+        if HAVE_PYARROW:
+            import pyarrow as pa
+
+            return pa.Table.from_pandas(rows_df, preserve_index=True)
+        return rows_df
+
+    key = (dataset_fp, view, page, page_size)
+    return _cached(_page_cache, PAGE_CACHE_SIZE, key, compute), total
+
+
+@st.fragment
+def show_preview(df, key='preview', page_size=PAGE_SIZE):
+    """
+    Display a paginated preview of a dataset with sort and filter controls.
+
+    Only the rows of the current page are sent to the browser, and paging
+    through the preview reruns this fragment instead of the whole page.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    key (str): Prefix of the widget keys, unique per page.
+    page_size (int): Rows per page.
+
+    Returns:
+    None
+    """
+    profile = session_profile(df)
+    dataset_fp = st.session_state.get('dataset_fp')
+    columns = list(df.columns)
+    filterable = profile['categorical_columns'] + profile['numerical_columns']
+
+    sort_col, direction_col, filter_col, value_col = st.columns(4)
+    sort_column = sort_col.selectbox("Sort by", [None] + columns, key=f"{key}_sort")
+    ascending = not direction_col.checkbox("Descending", key=f"{key}_descending")
+    filter_column = filter_col.selectbox("Filter by", [None] + filterable, key=f"{key}_filter")
+
+    filter_value = None
+    if filter_column in profile['value_counts']:
+        # Categories offered are the most frequent values profiled at ingest
+        values = profile['value_counts'][filter_column][filter_column].tolist()
+        filter_value = value_col.selectbox("Value", values, key=f"{key}_value_{filter_column}")
+    elif filter_column is not None:
+        low = float(profile['numeric_stats'].loc[filter_column, 'min'])
+        high = float(profile['numeric_stats'].loc[filter_column, 'max'])
+        if low < high:
+            filter_value = tuple(value_col.slider(
+                "Range", low, high, (low, high), key=f"{key}_range_{filter_column}"
+            ))
+    if filter_value is None:
+        filter_column = None
+
+    view = (sort_column, ascending, filter_column, filter_value)
+    total = len(df) if filter_column is None else len(filter_positions(df, dataset_fp, filter_column, filter_value))
+    pages = max(1, math.ceil(total / page_size))
+    # A smaller dataset or a narrower filter may leave the stored page out of range
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = st.number_input(f"Page (of {pages})", 1, pages, key=f"{key}_page")
+
+    rows, total = preview_page(df, dataset_fp, view, page - 1, page_size)
+    st.dataframe(rows)
+    start = (page - 1) * page_size
+    st.caption(f"Rows {min(start + 1, total)}-{min(start + page_size, total)} of {total:,}")
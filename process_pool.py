@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Number of processes rendering plots, 0 renders them in the calling thread
+RENDER_WORKERS = int(os.environ.get('EDA_RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """
+    Return the process pool shared by all sessions of the server, creating it on first use.
+
+    Workers are spawned rather than forked, since forking the multi-threaded
+    Streamlit server can deadlock the children.
+
+    Returns:
+    ProcessPoolExecutor: The pool, or None when RENDER_WORKERS is 0.
+    """
+    global _pool
+    if RENDER_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
@@ -0,0 +1,230 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from dataset_cache import session_profile
+from perf import span
+from sampling import dataset_sample
+
+# Exact results computed at once in the background, shared by all sessions
+REFINE_WORKERS = 2
+
+# Exact results of one session computing at once, the other charts of the
+# session wait for a free slot so that no session holds the whole pool
+REFINE_SESSION_LIMIT = int(os.environ.get('EDA_REFINE_SESSION_LIMIT', max(1, REFINE_WORKERS // 2)))
+
+# Seconds between two checks of the jobs of a chart waiting for its exact result
+POLL_SECONDS = 1.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    # Created on first use, so pages of small datasets never start the threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REFINE_WORKERS, thread_name_prefix='refine')
+        return _executor
+
+
+class RefineJob:
+    """
+    An exact computation running in the background for one chart of a session.
+
+    The job waits until the session has a free slot, then runs compute(df, cancelled)
+    on the pool. cancelled is a threading.Event that the computation checks between
+    its chunks.
+    """
+
+    def __init__(self, key, compute, df):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.future = None
+        self._compute = compute
+        self._df = df
+
+    def start(self):
+        self.future = _pool().submit(self._compute, self._df, self.cancelled)
+        self._compute = self._df = None
+
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def cancel(self):
+        # A waiting or queued job never starts, a running one stops at its next chunk
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+def _start_jobs(jobs):
+    # Start the waiting jobs of the session while fewer than REFINE_SESSION_LIMIT run
+    running = sum(job.running() for job in jobs.values())
+    for job in jobs.values():
+        if running >= REFINE_SESSION_LIMIT:
+            break
+        if job.future is None:
+            job.start()
+            running += 1
+
+
+def _state():
+    # Jobs of the session by chart, the charts drawn since the last full rerun,
+    # the slots still approximate in the chart being drawn and the charts whose
+    # exact result landed since the last rerun
+    return st.session_state.setdefault(
+        'refine', {'jobs': {}, 'requested': set(), 'drawing': [], 'refined': set()}
+    )
+
+
+def progressive_result(df, slot, cache, key, compute, adjust=None):
+    """
+    Return the exact result of a computation, or an approximation from the dataset sample until it is ready.
+
+    The first call for a key starts the exact computation in the background
+    and returns the result computed on the stratified sample. Later calls
+    return the exact result once it has landed, and store it in the cache.
+    A new key in the same slot, i.e. a new selection for the same chart,
+    cancels the previous job. Datasets too small to be sampled are computed
+    exactly right away.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    slot (str): The chart the result is for, e.g. 'stacked bar'.
+    cache (dict): Session cache of exact results.
+    key (tuple): Identifies the result in the cache.
+    compute (callable): Computes the result from a DataFrame, the dataset or its sample,
+    and a threading.Event set when the job is cancelled, None outside of a job.
+    It runs in a background thread, so it must not call Streamlit.
+    adjust (callable): Optional function receiving the result, the sample and the
+    dataset, e.g. to scale counts up to the size of the dataset.
+
+    Returns:
+    tuple: The result and whether it is approximate.
+    """
+    if key in cache:
+        return cache[key], False
+    sample = dataset_sample(st.session_state.get('dataset_fp'), df, session_profile(df))
+    if sample is None:
+        with span('compute', slot):
+            cache[key] = compute(df, None)
+        return cache[key], False
+
+    state = _state()
+    state['requested'].add(slot)
+    job = state['jobs'].get(slot)
+    approximate = st.session_state.setdefault('approximate_results', {})
+    if job is not None and job.key != key:
+        job.cancel()
+        approximate.pop(job.key, None)
+        job = None
+    if job is None:
+        job = RefineJob(key, compute, df)
+        state['jobs'][slot] = job
+    _start_jobs(state['jobs'])
+
+    if job.done():
+        del state['jobs'][slot]
+        approximate.pop(key, None)
+        # An exception of the exact computation is raised here, like a synchronous one
+        cache[key] = job.future.result()
+        return cache[key], False
+
+    if key not in approximate:
+        with span('compute', f"{slot} (sample)"):
+            result = compute(sample, None)
+            if adjust is not None:
+                result = adjust(result, sample, df)
+        approximate[key] = result
+    state['drawing'].append(slot)
+    return approximate[key], True
+
+
+def approximate_notice(df):
+    # Badge shown above a chart drawn from the sample
+    sample = dataset_sample(st.session_state.get('dataset_fp'), df, session_profile(df))
+    st.badge("Approximate", icon=":material/hourglass_top:", color='orange')
+    st.caption(
+        f"Computed on a stratified sample of {len(sample):,} of {len(df):,} rows, "
+        "the exact result replaces it when ready"
+    )
+
+
+def _poll(name, slots):
+    # Reruns every POLL_SECONDS while the chart waits, starting the jobs that waited for a
+    # free slot, and reruns the page once the chart's jobs are done
+    jobs = _state()['jobs']
+    _start_jobs(jobs)
+    if any(slot in jobs and not jobs[slot].done() for slot in slots):
+        return
+    _state()['refined'].add(name)
+    st.rerun()
+
+
+def progressive_chart(draw, df, *args):
+    """
+    Draw a chart that may start from the sample, and redraw it once its exact result has landed.
+
+    While a background job of the chart is pending, a small fragment polls
+    it every POLL_SECONDS without drawing anything. When the jobs are done
+    it reruns the page, where refined(draw) is true so that the page draws
+    the chart again, now from the exact result. Nothing polls once the
+    result is exact, and a rerun started by the user drops the poller.
+
+    Parameters:
+    draw (callable): Function drawing the chart from df and args, using progressive_result.
+    df (pd.DataFrame): The dataset.
+    args: The other arguments of draw.
+
+    Returns:
+    None
+    """
+    state = _state()
+    state['drawing'] = []
+    draw(df, *args)
+    if state['drawing']:
+        st.fragment(_poll, run_every=POLL_SECONDS)(draw.__name__, list(state['drawing']))
+
+
+def refined(draw):
+    """
+    Tell whether this rerun was started to redraw a chart whose exact result just landed.
+
+    Pages draw their charts when a button is clicked, or when this returns
+    true for the chart's draw function.
+
+    Parameters:
+    draw (callable): The function passed to progressive_chart.
+
+    Returns:
+    bool: True on the rerun following the completion of the chart's jobs.
+    """
+    return draw.__name__ in _state()['refined']
+
+
+def cancel_stale_jobs():
+    """
+    Cancel the jobs of charts that were not drawn in this rerun, called at the end of every page.
+
+    A chart that is not drawn anymore, because the selection changed or the
+    user moved to another page, has no use for its exact result.
+
+    Returns:
+    None
+    """
+    state = _state()
+    approximate = st.session_state.setdefault('approximate_results', {})
+    for slot in list(state['jobs']):
+        if slot not in state['requested']:
+            job = state['jobs'].pop(slot)
+            job.cancel()
+            approximate.pop(job.key, None)
+    state['requested'] = set()
+    state['refined'] = set()
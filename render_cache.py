@@ -0,0 +1,85 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Total size of the PNG images kept in memory before the least recently used ones are evicted
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('EDA_RENDER_CACHE_MAX_BYTES', 256 * 1024 ** 2))
+
+
+class RenderCache:
+    """
+    Process-wide LRU cache of rendered plots stored as PNG bytes.
+
+    Keys are tuples such as (dataset fingerprint, plot kind, columns, width, height),
+    so a cached image never has to go through pandas, seaborn or matplotlib again.
+    """
+
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            # An image larger than the whole budget is simply not cached
+            if len(png) > self.max_bytes:
+                return
+            self._entries[key] = png
+            self._size += len(png)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_or_render(self, key, render):
+        """
+        Return the cached PNG for a key, rendering and storing it on a miss.
+
+        Parameters:
+        key (tuple): The cache key, or None to render without caching.
+        render (callable): Function returning the PNG bytes of the plot.
+
+        Returns:
+        bytes: The PNG image.
+        """
+        if key is None:
+            return render()
+        png = self.get(key)
+        if png is None:
+            png = render()
+            self.put(key, png)
+        return png
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        # Counters shown in the page sidebars
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Shared by every session of the Streamlit server process
+render_cache = RenderCache()
@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Datasets with more rows than this render from a sample first while the exact
+# result is computed in the background, 0 always computes the exact result
+SAMPLE_THRESHOLD = int(os.environ.get('EDA_SAMPLE_THRESHOLD', 1_000_000))
+
+# Rows drawn uniformly into the sample
+SAMPLE_ROWS = int(os.environ.get('EDA_SAMPLE_ROWS', 100_000))
+
+# Rows every category of a stratified column is guaranteed in the sample
+MIN_PER_STRATUM = 20
+
+# Categorical columns with more categories than this are not stratified
+MAX_STRATA = 1000
+
+# Number of dataset samples kept in memory
+SAMPLE_CACHE_SIZE = 8
+
+_samples = OrderedDict()
+_samples_lock = threading.Lock()
+
+
+def stratified_sample(df, strata=(), n=SAMPLE_ROWS, min_per_stratum=MIN_PER_STRATUM, seed=0):
+    """
+    Draw a reservoir sample of the rows that keeps every category of the strata columns.
+
+    Every row gets a random priority and the n rows with the lowest
+    priorities form a uniform sample, which is what reservoir sampling
+    keeps. For every category of the strata columns, the min_per_stratum
+    rows of that category with the lowest priorities are added, so rare
+    categories still show up in charts drawn from the sample.
+
+    Parameters:
+    df (pd.DataFrame): The dataset.
+    strata (list): The categorical columns to stratify on.
+    n (int): Number of uniformly sampled rows.
+    min_per_stratum (int): Rows guaranteed to every category.
+    seed (int): Seed of the random generator, so reruns draw the same sample.
+
+    Returns:
+    pd.DataFrame: The sampled rows, in their original order.
+    """
+    rows = len(df)
+    if rows <= n:
+        return df
+    # order[i] is the row with the i-th lowest priority
+    order = np.random.default_rng(seed).permutation(rows)
+    keep = np.zeros(rows, dtype=bool)
+    keep[order[:n]] = True
+    for column in strata:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+        else:
+            codes = pd.factorize(series)[0]
+        codes = codes[order]
+        # Rank of every row within its category, in priority order
+        rank = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+        keep[order[rank < min_per_stratum]] = True
+    return df.iloc[np.flatnonzero(keep)]
+
+
+def dataset_sample(key, df, profile):
+    """
+    Return the stratified sample of a large dataset, drawing it once per process.
+
+    Parameters:
+    key (str): The dataset fingerprint.
+    df (pd.DataFrame): The dataset.
+    profile (dict): Its profile, telling which columns to stratify on.
+
+    Returns:
+    pd.DataFrame: The sample, or None if the dataset is small enough to use as is.
+    """
+    if SAMPLE_THRESHOLD <= 0 or len(df) <= SAMPLE_THRESHOLD or key is None:
+        return None
+    with _samples_lock:
+        if key in _samples:
+            _samples.move_to_end(key)
+            return _samples[key]
+    strata = [
+        column for column in profile['categorical_columns']
+        if profile['columns'][column]['nunique'] <= MAX_STRATA
+    ]
+    sample = stratified_sample(df, strata)
+    with _samples_lock:
+        _samples[key] = sample
+        while len(_samples) > SAMPLE_CACHE_SIZE:
+            _samples.popitem(last=False)
+    return sample
+
+
+def scale_counts(counts, sample, df):
+    # Counts taken on the sample, scaled up to the size of the dataset
+    return np.round(counts * (len(df) / len(sample)))
+
+
+def calibrate_counts(table, totals, sample, df):
+    """
+    Scale a contingency table counted on the sample so that its rows add up to known category counts.
+
+    Stratification oversamples rare categories, so a single scale factor
+    would overstate them. Rows whose category count is unknown are scaled
+    by the sampling rate.
+
+    Parameters:
+    table (pd.DataFrame): The table counted on the sample, one row per category.
+    totals (pd.Series): Exact counts of the row categories, e.g. from the dataset profile.
+    sample (pd.DataFrame): The sample.
+    df (pd.DataFrame): The dataset.
+
+    Returns:
+    pd.DataFrame: The estimated table of the dataset.
+    """
+    factors = pd.Series(len(df) / len(sample), index=table.index)
+    known = totals.reindex(table.index)
+    sums = table.sum(axis=1)
+    calibrated = known.notna() & (sums > 0)
+    factors[calibrated] = known[calibrated] / sums[calibrated]
+    return table.mul(factors, axis=0).round()
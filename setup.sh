@@ -8,4 +8,6 @@ echo "\
 headless = true\n\
 enableCORS=false\n\
 port = $PORT\n\
-" > ~/.streamlit/config.toml
\ No newline at end of file
+" > ~/.streamlit/config.toml
+# Build the matplotlib font cache before the first request needs it
+python warmup.py
@@ -0,0 +1,288 @@
+import math
+import os
+
+import numpy as np
+import streamlit as st
+
+# 'matplotlib' rasterizes the charts on the server, 'vega' sends pre-aggregated
+# data to the browser and lets Vega-Lite draw them there
+CHART_BACKEND = os.environ.get('EDA_CHART_BACKEND', 'matplotlib')
+
+# Largest number of outliers sent per box, the extremes are always kept
+MAX_CLIENT_OUTLIERS = 200
+
+
+def show_chart(spec):
+    # The browser draws the chart, only the aggregated values in the specification are sent
+    st.vega_lite_chart(spec, width='stretch')
+
+
+def client_chart(renderer, *args):
+    """
+    Build the Vega-Lite counterpart of a charts.py renderer from the same arguments.
+
+    Parameters:
+    renderer (callable): One of the chart functions of charts.py.
+    args: The arguments of the renderer.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    return globals()[renderer.__name__](*args)
+
+
+def _number(value):
+    # JSON has no NaN or infinity, missing numbers are sent as null
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _outliers(fliers, max_outliers=MAX_CLIENT_OUTLIERS):
+    fliers = np.asarray(fliers, dtype='float64')
+    if len(fliers) > max_outliers:
+        # Evenly spaced order statistics keep the shape of the tails
+        fliers = np.sort(fliers)[np.linspace(0, len(fliers) - 1, max_outliers).astype('int64')]
+    return fliers
+
+
+def countplot(value_counts, column):
+    """
+    Build a count plot from precomputed value counts.
+
+    Parameters:
+    value_counts (pd.DataFrame): The values in the first column and their counts in the second.
+    column (str): The name of the categorical column.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    values = [
+        {'value': str(value), 'count': int(count)}
+        for value, count in zip(value_counts.iloc[:, 0], value_counts.iloc[:, 1])
+    ]
+    return {
+        'data': {'values': values},
+        'mark': 'bar',
+        'encoding': {
+            'x': {'field': 'value', 'type': 'nominal', 'sort': None, 'title': column},
+            'y': {'field': 'count', 'type': 'quantitative', 'title': 'Count'},
+            'tooltip': [{'field': 'value', 'title': column}, {'field': 'count', 'title': 'Count'}],
+        },
+    }
+
+
+def histogram(hist, column):
+    """
+    Build a histogram from precomputed bin counts.
+
+    Parameters:
+    hist (tuple): The counts and bin edges from aggregates.histogram_summary.
+    column (str): The name of the numerical column.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    counts, edges = hist
+    values = [
+        {'start': _number(start), 'end': _number(end), 'count': int(count)}
+        for start, end, count in zip(edges[:-1], edges[1:], counts)
+    ]
+    return {
+        'data': {'values': values},
+        'mark': {'type': 'bar', 'opacity': 0.7},
+        'encoding': {
+            'x': {'field': 'start', 'type': 'quantitative', 'title': column},
+            'x2': {'field': 'end'},
+            'y': {'field': 'count', 'type': 'quantitative', 'title': 'Count'},
+            'tooltip': [{'field': 'start'}, {'field': 'end'}, {'field': 'count'}],
+        },
+    }
+
+
+def _box_layers(boxes, label_title, value_title, horizontal):
+    # Whiskers, box, median and outliers of precomputed boxplot statistics
+    stats = [
+        {
+            'label': str(box['label']),
+            'q1': _number(box['q1']),
+            'median': _number(box['med']),
+            'q3': _number(box['q3']),
+            'low': _number(box['whislo']),
+            'high': _number(box['whishi']),
+        }
+        for box in boxes
+    ]
+    fliers = [
+        {'label': str(box['label']), 'value': _number(value)}
+        for box in boxes
+        for value in _outliers(box['fliers'])
+    ]
+    value, value2, label = ('x', 'x2', 'y') if horizontal else ('y', 'y2', 'x')
+    label_encoding = {label: {'field': 'label', 'type': 'nominal', 'sort': None, 'title': label_title}}
+
+    def encoding(low, high=None):
+        channels = dict(label_encoding)
+        channels[value] = {'field': low, 'type': 'quantitative', 'title': value_title}
+        if high is not None:
+            channels[value2] = {'field': high}
+        return channels
+
+    return [
+        {'data': {'values': stats}, 'mark': 'rule', 'encoding': encoding('low', 'high')},
+        {'data': {'values': stats}, 'mark': {'type': 'bar', 'size': 20}, 'encoding': encoding('q1', 'q3')},
+        {
+            'data': {'values': stats},
+            'mark': {'type': 'tick', 'color': 'white', 'size': 20},
+            'encoding': encoding('median'),
+        },
+        {'data': {'values': fliers}, 'mark': {'type': 'point', 'size': 12}, 'encoding': encoding('value')},
+    ]
+
+
+def boxplot(box, column):
+    """
+    Build a horizontal boxplot from precomputed quartiles, whiskers and outliers.
+
+    Parameters:
+    box (dict): The statistics from aggregates.box_summary.
+    column (str): The name of the numerical column.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    return {'layer': _box_layers([box], None, column, horizontal=True)}
+
+
+def group_boxplot(boxes, x_column, y_column):
+    """
+    Build one vertical box per category from precomputed statistics.
+
+    Parameters:
+    boxes (list): One dict per category, as returned by aggregates.group_box_summaries.
+    x_column (str): The categorical column.
+    y_column (str): The numerical column.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    return {'layer': _box_layers(boxes, x_column, y_column, horizontal=False)}
+
+
+def bar_plot(stats, lower, upper, x_column, y_column):
+    """
+    Build a bar plot of group means with optional confidence intervals.
+
+    Parameters:
+    stats (pd.DataFrame): The group statistics from aggregates.group_stats.
+    lower (pd.Series): Lower confidence bounds by category, or None.
+    upper (pd.Series): Upper confidence bounds by category, or None.
+    x_column (str): The categorical column.
+    y_column (str): The numerical column.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    values = []
+    for i, (category, mean) in enumerate(stats['mean'].items()):
+        row = {'category': str(category), 'mean': _number(mean)}
+        if lower is not None:
+            row['lower'] = _number(lower.iloc[i])
+            row['upper'] = _number(upper.iloc[i])
+        values.append(row)
+    x = {'field': 'category', 'type': 'nominal', 'sort': None, 'title': x_column}
+    layers = [{
+        'mark': 'bar',
+        'encoding': {
+            'x': x,
+            'y': {'field': 'mean', 'type': 'quantitative', 'title': y_column},
+            'color': {'field': 'category', 'type': 'nominal', 'sort': None, 'legend': None},
+        },
+    }]
+    if lower is not None:
+        layers.append({
+            'mark': {'type': 'rule', 'color': '#424242'},
+            'encoding': {'x': x, 'y': {'field': 'lower', 'type': 'quantitative'}, 'y2': {'field': 'upper'}},
+        })
+    return {'data': {'values': values}, 'layer': layers}
+
+
+def stacked_bar(table, x_column, y_column):
+    """
+    Build a stacked bar chart from a contingency table.
+
+    Parameters:
+    table (pd.DataFrame): Counts with the x categories as rows and the y categories as columns.
+    x_column (str): The categorical column on the x axis.
+    y_column (str): The categorical column of the stacks.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    counts = table.to_numpy()
+    values = [
+        {'x': str(row), 'y': str(column), 'count': int(counts[i, j])}
+        for i, row in enumerate(table.index)
+        for j, column in enumerate(table.columns)
+        if counts[i, j]
+    ]
+    return {
+        'data': {'values': values},
+        'mark': 'bar',
+        'encoding': {
+            'x': {'field': 'x', 'type': 'nominal', 'sort': [str(row) for row in table.index], 'title': x_column},
+            'y': {'field': 'count', 'type': 'quantitative', 'stack': 'zero', 'title': 'Count'},
+            'color': {
+                'field': 'y', 'type': 'nominal', 'sort': [str(column) for column in table.columns],
+                'scale': {'scheme': 'viridis'}, 'title': y_column,
+            },
+            'tooltip': [{'field': 'x', 'title': x_column}, {'field': 'y', 'title': y_column}, {'field': 'count'}],
+        },
+    }
+
+
+def heatmap(matrix, title, annotate=True, sequential=False):
+    """
+    Build a correlation heatmap from the cells of a matrix.
+
+    Parameters:
+    matrix (pd.DataFrame): The correlation matrix.
+    title (str): The chart title.
+    annotate (bool): Whether to print the value in every cell.
+    sequential (bool): Whether the values go from 0 to 1, like association measures, instead of -1 to 1.
+
+    Returns:
+    dict: The Vega-Lite specification.
+    """
+    cells = matrix.to_numpy()
+    rows = [str(row) for row in matrix.index]
+    columns = [str(column) for column in matrix.columns]
+    values = [
+        {'row': row, 'column': column, 'value': _number(cells[i, j])}
+        for i, row in enumerate(rows)
+        for j, column in enumerate(columns)
+    ]
+    if sequential:
+        scale = {'scheme': 'blues', 'domain': [0, 1]}
+    else:
+        scale = {'scheme': 'redblue', 'reverse': True, 'domain': [-1, 1]}
+    encoding = {
+        'x': {'field': 'column', 'type': 'nominal', 'sort': columns, 'title': None},
+        'y': {'field': 'row', 'type': 'nominal', 'sort': rows, 'title': None},
+    }
+    layers = [{
+        'mark': 'rect',
+        'encoding': {
+            **encoding,
+            'color': {
+                'field': 'value', 'type': 'quantitative',
+                'scale': scale,
+            },
+            'tooltip': [{'field': 'row'}, {'field': 'column'}, {'field': 'value', 'format': '.2f'}],
+        },
+    }]
+    if annotate:
+        layers.append({
+            'mark': {'type': 'text', 'fontSize': 10},
+            'encoding': {**encoding, 'text': {'field': 'value', 'type': 'quantitative', 'format': '.2f'}},
+        })
+    return {'title': title, 'data': {'values': values}, 'layer': layers}
@@ -0,0 +1,76 @@
+"""
+Import the heavy libraries ahead of the first request that needs them.
+
+On a freshly started dyno the first page to draw a chart pays for importing
+pandas, matplotlib and seaborn and for building the matplotlib font cache.
+start_warmup() does that work on a background thread as soon as the menu is
+served. Running this file directly does the same in the foreground, which
+setup.sh uses to build the font cache before the server starts.
+
+Usage:
+python warmup.py
+"""
+import importlib
+import os
+import threading
+import time
+
+# Set EDA_WARMUP=0 to disable the background warm-up
+WARMUP_ENABLED = os.environ.get('EDA_WARMUP', '1') != '0'
+
+# Imported in this order, the later ones import the earlier ones
+HEAVY_MODULES = [
+    'numpy',
+    'pandas',
+    'pyarrow.parquet',
+    'matplotlib.backends.backend_agg',
+    'seaborn',
+]
+
+_started = False
+_lock = threading.Lock()
+
+
+def warm_up():
+    """
+    Import the heavy modules and draw a small figure so the font cache exists.
+
+    Returns:
+    dict: Seconds spent on every step, keyed by module name.
+    """
+    timings = {}
+    for name in HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        timings[name] = time.perf_counter() - start
+
+    # Text rendering loads (and on first run builds) the font cache
+    from figures import close_figure, new_figure
+
+    start = time.perf_counter()
+    fig = new_figure(1, 1, 50)
+    fig.text(0.5, 0.5, 'warm-up')
+    fig.canvas.draw()
+    close_figure(fig)
+    timings['font cache'] = time.perf_counter() - start
+    return timings
+
+
+def start_warmup():
+    # Start the warm-up once per process, never blocking the calling script
+    global _started
+    if not WARMUP_ENABLED:
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name='warmup', daemon=True).start()
+
+
+if __name__ == '__main__':
+    for step, seconds in warm_up().items():
+        print(f"{step:<35} {seconds:6.2f} s")